@@ -1,16 +1,11 @@
 import os
+import time
 import threading
-import queue
 
 from utils.grid_tools_2d import Point, Vector
 from utils.intcode_computer import IntCodeComputer, get_program
-
-
-def get_input(filepath):
-    # Load the comma separated intcode program from a file into memory (a list).
-    with open(filepath) as f:
-        data = [line.strip() for line in f]
-    return
+from utils import intcode_channel
+from utils.intcode_channel import CancellationToken, Cancelled, RingChannel
 
 
 BLACK = 0
@@ -19,8 +14,6 @@ WHITE = 1
 
 class PaintRobot:
     debug = False
-    READ_TIMEOUT = 10
-    WRITE_TIMEOUT = 10
 
     def __init__(self, program, grid, starting_position, starting_facing):
         """
@@ -32,12 +25,16 @@ class PaintRobot:
         self.grid = grid
         self.position = starting_position
         self.direction = starting_facing
-        self.optical_scanner = queue.Queue(1)
-        self.move_instructions = queue.Queue(2)
+        # Ring channels wake a blocked read or write as soon as the shared token is cancelled
+        self.optical_scanner = RingChannel(1)
+        self.move_instructions = RingChannel(2)
         self.brain = IntCodeComputer(
             program, input_queue=self.optical_scanner, output_queue=self.move_instructions, name="PainterBrain"
         )
         self.brain.debug = self.debug
+        # Shared by the robot and its brain, so whichever stops first wakes the other
+        self.cancellation = CancellationToken()
+        self.brain.cancellation = self.cancellation
         self.running = False
         # Track panels visited for the Part 1
         self.visited_panels = {self.position}
@@ -46,12 +43,12 @@ class PaintRobot:
         color = self.grid[self.position.y][self.position.x]
         if color == BLACK:
             # Send 0
-            self.optical_scanner.put(0, timeout=self.WRITE_TIMEOUT)
+            intcode_channel.put(self.optical_scanner, 0, self.cancellation)
             if self.debug:
                 print("Painter scanner put BLACK", self.optical_scanner.qsize())
         elif color == WHITE:
             # Send 1
-            self.optical_scanner.put(1, timeout=self.WRITE_TIMEOUT)
+            intcode_channel.put(self.optical_scanner, 1, self.cancellation)
             if self.debug:
                 print("Painter scanner put WHITE", self.optical_scanner.qsize())
         else:
@@ -60,10 +57,10 @@ class PaintRobot:
     def get_next_instruction(self):
         if self.debug:
             print("Getting instructions from brain...")
-        color = self.move_instructions.get(timeout=self.READ_TIMEOUT)
+        color = intcode_channel.get(self.move_instructions, self.cancellation)
         if self.debug:
             print("Painter got color code", color)
-        direction = self.move_instructions.get(timeout=self.READ_TIMEOUT)
+        direction = intcode_channel.get(self.move_instructions, self.cancellation)
         if self.debug:
             print("Painter got direction code", direction)
         return color, direction
@@ -107,35 +104,70 @@ class PaintRobot:
     def stop(self):
         self.running = False
 
+    def run_brain(self):
+        try:
+            self.brain.run()
+        finally:
+            # Wake the robot if it's waiting on a brain that has halted
+            self.cancellation.cancel()
+
     def run(self):
-        brain_thread = threading.Thread(target=lambda: self.brain.run(memory_allocation_size=10000))
+        # The brain leaves the shared token alone, so a cancel can't be lost while its thread starts up
+        self.cancellation.reset()
+        brain_thread = threading.Thread(target=self.run_brain)
         brain_thread.start()
         self.running = True
         while self.running:
             if self.debug:
                 print('Tick')
-            if not self.brain.running:
-                self.stop()
-                continue
             try:
                 self.scan_panel()
                 color, direction = self.get_next_instruction()
                 self.paint_panel(color)
                 self.set_direction(direction)
                 self.move()
+            except Cancelled:
+                # The brain halted
+                self.stop()
             except BaseException as e:
                 print("Exception:", e)
                 self.stop()
         # Terminate the brain
-        if brain_thread.is_alive():
-            self.brain.running = False
-            brain_thread.join()
+        self.brain.cancel()
+        brain_thread.join()
 
         print(len(self.visited_panels))
 
 
 def tests():
-    pass
+    # Paints its first panel white and turns left, then paints the next black, turns right and halts
+    program = [3, 100, 104, 1, 104, 0, 3, 100, 104, 0, 104, 1, 99]
+    grid = [list([BLACK]) * 5 for _ in range(5)]
+    painter = PaintRobot(program, grid, Point(2, 2), Vector(0, -1))
+    start = time.perf_counter()
+    painter.run()
+    # Stops as soon as the brain halts, instead of waiting on a read that will never be answered
+    assert time.perf_counter() - start < 1
+    assert grid[2][2] == WHITE and grid[2][1] == BLACK
+    assert painter.visited_panels == {Point(2, 2), Point(1, 2), Point(1, 1)}
+
+    # The robot fails before the brain has even booted. The brain still sees the cancel and stops.
+    import io
+    import contextlib
+    grid = [list([7]) * 5 for _ in range(5)]
+    painter = PaintRobot(program, grid, Point(2, 2), Vector(0, -1))
+    boot = painter.brain.boot
+
+    def slow_boot(*args):
+        time.sleep(0.2)
+        boot(*args)
+
+    painter.brain.boot = slow_boot
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread = threading.Thread(target=painter.run, daemon=True)
+        thread.start()
+        thread.join(2)
+    assert not thread.is_alive()
     print("Tests Done")
 
 
@@ -1,10 +1,11 @@
 import os
 import threading
-import queue
 import time
 
 from utils.grid_tools_2d import Point, Vector
 from utils.intcode_computer import IntCodeComputer, get_program
+from utils import intcode_channel
+from utils.intcode_channel import CancellationToken, Cancelled, OutputSink, RingChannel
 
 import curses
 
@@ -20,9 +21,15 @@ class Terminal:
         4: "*",
     }
 
-    def __init__(self, stdout=None, stdin=None, width=10, height=10, debug=False, log=None):
+    def __init__(self, stdout=None, stdin=None, width=10, height=10, debug=False, log=None, cancellation=None):
+        """
+        :param RingChannel -> stdout: Frames from the cabinet, each a list of (x, y, value) updates
+        :param RingChannel -> stdin: Joystick moves to the cabinet
+        :param CancellationToken -> cancellation: Cancelled when the cabinet halts
+        """
         self.stdout = stdout
         self.stdin = stdin
+        self.cancellation = cancellation
         self.width = width
         self.height = height
         self.grid = self.generate_grid(width, height)
@@ -84,6 +91,10 @@ class Terminal:
                 self.game_win.addstr(y, x, self.tiles[value])
                 self.game_win.refresh()
 
+    def draw(self, frame):
+        for x, y, value in frame:
+            self.update(x, y, value)
+
     def vanilla_render(self):
         if not self.debug:
             print(chr(27) + "[2J")
@@ -105,26 +116,6 @@ class Terminal:
             self.game_win.refresh()
             self.score_win.refresh()
 
-    def read_stdout(self):
-        if self.stdout is None:
-            value = int(input("Input:"))
-        elif hasattr(self.stdout, 'get'):
-            value = self.stdout.get()
-            # timeouts = 0
-            # while self.running and timeouts < self.MAX_TIMEOUTS:
-            #     try:
-            #         value = self.input_queue.get(timeout=self.READ_TIMEOUT)
-            #     except queue.Empty:
-            #         timeouts += 1
-            #         if self.debug:
-            #             print("Input Timeout {} ({})".format(timeouts, self.input_queue.qsize()))
-        elif hasattr(self.stdout, 'pop'):
-            value = self.stdout.pop(0)
-        else:
-            raise RuntimeError("Invalid input configured.")
-
-        return value
-
     def read_input(self):
         key = self.screen.getch()
         if key == ord('q'):
@@ -152,25 +143,21 @@ class Terminal:
         self.stdin.put(move)
 
     def process_events(self):
-        if self.stdout.qsize() >= 3:
-            x = self.read_stdout()
-            y = self.read_stdout()
-            tile_id = self.read_stdout()
-            self.update(x, y, tile_id)
-            return True
-        return False
+        # Wait for the next frame: every update the cabinet made before it next wanted input (or halted)
+        self.draw(intcode_channel.get(self.stdout, self.cancellation))
 
     def run(self):
         self.running = True
         self.activate_curses()
         try:
             while self.running:
+                self.process_events()
                 self.render()
-                if self.process_events():
-                    continue  # Keep processing
-                # time.sleep(0.15)
                 # self.read_input()
                 self.ai_input()
+        except Cancelled:
+            # The cabinet halted
+            pass
         except Exception as e:
             self.log_debug(str(e))
         finally:
@@ -235,29 +222,42 @@ def count_blocks(grid):
 
 
 def run(program):
-    terminal_socket = queue.Queue()
-    joystick_socket = queue.Queue()
+    # Ring channels wake a blocked read or write as soon as the token is cancelled
+    frames = RingChannel()
+    joystick_socket = RingChannel()
+    cancellation = CancellationToken()
     with open(debug_log, mode="w") as log:
-        terminal = Terminal(terminal_socket, joystick_socket, width=38, height=22, debug=True, log=log)
+        terminal = Terminal(
+            frames, joystick_socket, width=38, height=22, debug=True, log=log, cancellation=cancellation
+        )
         computer = IntCodeComputer(
-            program, input_queue=joystick_socket, output_queue=terminal_socket, name="ArcadeCabinet",
-            debug=True, log=log
+            program, input_queue=joystick_socket,
+            output_queue=OutputSink(lambda frame: frames.put(frame, cancellation), arity=3, batched=True),
+            name="ArcadeCabinet", debug=True, log=log
         )
-        computation_thread = threading.Thread(target=lambda: computer.run(memory_allocation_size=10000))
-        gui_thread = threading.Thread(target=lambda: terminal.run())
+        computer.cancellation = cancellation
+
+        def run_computer():
+            try:
+                computer.run()
+            finally:
+                # Wake the terminal once it has drawn the last frame
+                cancellation.cancel()
+
+        computation_thread = threading.Thread(target=run_computer)
+        gui_thread = threading.Thread(target=terminal.run)
 
         try:
             computation_thread.start()
             gui_thread.start()
         except:
-            computer.running = False
+            computer.cancel()
             terminal.running = False
 
-        computation_thread.join()
-        while terminal_socket.qsize() > 0:
-            pass
-        terminal.running = False
         gui_thread.join()
+        # The terminal also stops if the player quits
+        computer.cancel()
+        computation_thread.join()
 
     blocks = count_blocks(terminal.grid)
     print(count_blocks(terminal.grid))
@@ -267,8 +267,21 @@ def run(program):
 
 
 def tests():
-    t = Terminal([1,2,3,6,5,4], 10, 10)
-    t.run()
+    # Draws a block, the paddle, the ball and a score, reads the joystick, then clears the block and halts
+    program = [
+        104, 1, 104, 1, 104, 2, 104, 2, 104, 3, 104, 3, 104, 0, 104, 3, 104, 4, 104, -1, 104, 0, 104, 10,
+        3, 100, 104, 1, 104, 1, 104, 0, 99
+    ]
+    frames = []
+    IntCodeComputer(program, [0], OutputSink(frames.append, arity=3, batched=True)).run()
+    assert frames == [[(1, 1, 2), (2, 3, 3), (0, 3, 4), (-1, 0, 10)], [(1, 1, 0)]]
+
+    terminal = Terminal(width=5, height=5)
+    terminal.draw(frames[0])
+    assert count_blocks(terminal.grid) == 1 and terminal.score == 10
+    assert AI(debug=False).get_next_move(terminal.grid) == -1
+    terminal.draw(frames[1])
+    assert count_blocks(terminal.grid) == 0
     print("Tests Done")
 
 
@@ -277,25 +290,23 @@ class ArcadeCabinet(IntCodeComputer):
     def __init__(self, program, name="ArcadeCabinet", debug=False, log=None):
         super().__init__(program, name=name, debug=debug, log=log)
         self.terminal = Terminal(width=38, height=22, debug=debug, log=log)
-        self.instruction = []
+        # The screen is redrawn once per frame rather than once per tile
+        self.output_queue = OutputSink(self.draw, arity=3, batched=True)
         self.ai = AI(debug=debug, log=log)
 
-    def output(self, address):
-        value = self.program_memory[address]
-        self.instruction.append(value)
-        if len(self.instruction) == 3:
-            self.terminal.update(*self.instruction)
-            self.terminal.render()
-            self.instruction = []
+    def draw(self, frame):
+        self.terminal.draw(frame)
+        self.terminal.render()
 
     def input(self, store):
+        self.flush_output()
         value = self.ai.get_next_move(self.terminal.grid)
         self.program_memory[store] = value
 
-    def run(self, noun=None, verb=None, memory_allocation_size=None):
+    def run(self, noun=None, verb=None):
         self.terminal.activate_curses()
         try:
-            super().run(noun=noun, verb=verb, memory_allocation_size=memory_allocation_size)
+            super().run(noun=noun, verb=verb)
         finally:
             self.terminal.deactivate_curses()
 
@@ -308,7 +319,7 @@ if __name__ == "__main__":
     # Insert 2 quarters
     program[0] = 2
     arcade = ArcadeCabinet(program)
-    arcade.run(memory_allocation_size=10000)
+    arcade.run()
 
     print("Blocks:", count_blocks(arcade.terminal.grid))
     print("Score:", arcade.terminal.score)
@@ -1,60 +1,20 @@
 import os
-import copy
 
-def get_program(filepath):
-    # Load the comma separated intcode program from a file into memory (a list).
-    with open(filepath) as f:
-        incode = [int(v) for v in f.readline().split(",")]
-    return incode
-
-
-class IntCodeComputer:
-
-    @staticmethod
-    def restore_state(program, noun, verb):
-        program[1] = noun
-        program[2] = verb
-        return program
-
-    def run(self, program):
-        self.program = program
-        self.running = True
-        self.program_counter = 0
-        while self.running:
-            opcode = self.program[self.program_counter]
-            inputs = [self.program[self.program_counter + i] for i in range(1, 4)]
-            self.perform_operation(opcode, inputs)
-            self.program_counter += 4
-        return self.program
-
-    def add(self, inputs):
-        x_pos, y_pos, store_pos = inputs
-        self.program[store_pos] = self.program[x_pos] + self.program[y_pos]
-
-    def multiply(self, inputs):
-        x_pos, y_pos, store_pos = inputs
-        self.program[store_pos] = self.program[x_pos] * self.program[y_pos]
-
-    def halt(self, inputs):
-        self.running = False
-
-    def perform_operation(self, opcode, inputs):
-        ops = {
-            1: self.add,
-            2: self.multiply,
-            99: self.halt
-        }
-        ops[opcode](inputs)
+from utils.intcode_loader import get_program
+from utils.intcode_compat import ProgramIntCodeComputer as IntCodeComputer
+from utils.intcode_pool import MachinePool
+from utils.intcode_symbolic import solve_noun_verb
 
 
 def noun_verb_search(program, desired_output):
-    computer = IntCodeComputer()
+    # One machine for the whole sweep, its memory restored in place for each run
+    pool = MachinePool(program)
+    machine = pool.acquire()
     for noun in range(100):
         for verb in range(100):
-            test_state = copy.copy(program)
-            computer.restore_state(test_state, noun, verb)
-            output = computer.run(test_state)[0]
-            if output == desired_output:
+            machine.reset({1: noun, 2: verb})
+            machine.execute()
+            if machine.program_memory[0] == desired_output:
                 return noun, verb
     raise ValueError("Desired value {} is unreachable!".format(desired_output))
 
@@ -63,7 +23,7 @@ if __name__ == "__main__":
     input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
     program = get_program(input_file)
 
-    noun, verb = noun_verb_search(program, 19690720)
+    noun, verb = solve_noun_verb(program, 19690720)
     print("Solution:", 100 * noun + verb, "Noun:", noun, "Verb:", verb)
 
 
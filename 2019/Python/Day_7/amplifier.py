@@ -1,71 +1,66 @@
 import os
-import copy
-import threading
-import queue
+from math import ceil, factorial
 from itertools import permutations
 # from intcode_computer import get_program, IntCodeComputer
 from utils.intcode_computer import get_program, IntCodeComputer
+from utils.intcode_network import IntCodeNetwork
+from utils.intcode_cache import ResultCache
+from utils.intcode_search import parallel_maximize
 
 
-class AmplifierIntCodeComputer(IntCodeComputer):
-    """
-    IntCode computer that takes inputs and writes outputs via queues. Designed to run in it's own thread.
+class AmplifierCircuit:
     """
+    Amplifiers in a ring, run cooperatively from the calling thread by an IntCodeNetwork.
 
-    def __init__(self, program, input_queue, output_queue, name="Amplifier"):
-        self.program = copy.copy(program)
-        self.input_queue = input_queue
-        self.output_queue = output_queue
-        self.name = name
-
-    def run(self):
-        return super().run(copy.copy(self.program))
-
-    def input(self, store_pos):
-        input_value = self.input_queue.get()
-        self.program[store_pos] = input_value
-
-    def output(self, value):
-        self.output_queue.put(value)
+    Given a ResultCache, each amplifier is first tried on its own with just its phase setting and input signal.
+    If they all halt with one output (a plain chain, as in part 1) the network isn't needed, and permutations that
+    share a prefix only run the shared amplifiers once.
 
+    The circuit has one amplifier per phase setting, so it grows to fit longer phase settings.
+    """
 
-class AmplifierCircuit:
+    def __init__(self, program, amplifiers=5, cache=None):
+        self.program = program
+        self.circuit = []
+        self.cache = cache
+        self.add_amplifiers(amplifiers)
 
-    def __init__(self, program):
-        self.io_queues = [
-            queue.Queue(2),
-            queue.Queue(2),
-            queue.Queue(2),
-            queue.Queue(2),
-            queue.Queue(2),
-        ]
-        self.circuit = [
-            IntCodeComputer(program, self.io_queues[0], self.io_queues[1], "Amp 1"),
-            IntCodeComputer(program, self.io_queues[1], self.io_queues[2], "Amp 2"),
-            IntCodeComputer(program, self.io_queues[2], self.io_queues[3], "Amp 3"),
-            IntCodeComputer(program, self.io_queues[3], self.io_queues[4], "Amp 4"),
-            IntCodeComputer(program, self.io_queues[4], self.io_queues[0], "Amp 5")
-        ]
+    def add_amplifiers(self, amplifiers):
+        while len(self.circuit) < amplifiers:
+            self.circuit.append(IntCodeComputer(self.program, name="Amp {}".format(len(self.circuit) + 1)))
 
     def run(self, phase_settings):
-        for io_queue, phase_setting in zip(self.io_queues, phase_settings):
-            io_queue.put(phase_setting)
-        self.io_queues[0].put(0)
-
-        # Start the amplifiers
-        threads = []
-        for amplifier in self.circuit:
-            thread = threading.Thread(target=amplifier.run)
-            threads.append(thread)
-            thread.start()
-
-        # Block until all threads are done
-        for thread in threads:
-            thread.join()
-
-        output = self.io_queues[0].get_nowait()
+        if self.cache is not None:
+            output = self.run_chain(phase_settings)
+            if output is not None:
+                return output
+
+        # Channel i is the input of amplifier i and the output of the amplifier before it
+        self.add_amplifiers(len(phase_settings))
+        network = IntCodeNetwork()
+        for i, phase_setting in enumerate(phase_settings):
+            network.add_channel(i, [phase_setting])
+        network.channels[0].append(0)
+        for i, amplifier in enumerate(self.circuit[:len(phase_settings)]):
+            amplifier.reset()
+            network.add_machine(amplifier.name, amplifier, i, [(i + 1) % len(phase_settings)])
+
+        channels = network.run(resume=True)
+        if network.deadlocked:
+            raise RuntimeError("Amplifier circuit deadlocked")
+        output = channels[0][0]
         return output
 
+    def run_chain(self, phase_settings):
+        # The last amplifier's output, or None if an amplifier needs feedback
+        signal = 0
+        for phase_setting in phase_settings:
+            result = self.cache.run(self.program, inputs=(phase_setting, signal))
+            if not result.halted or len(result.outputs) != 1:
+                return None
+            signal = result.outputs[0]
+        return signal
+
 
 def calculate_max_phase_setting(circuit, phase_options):
     max_thrust = 0
@@ -78,6 +73,36 @@ def calculate_max_phase_setting(circuit, phase_options):
     return max_phase_settings, max_thrust
 
 
+def cached_circuit(program):
+    return AmplifierCircuit(program, cache=ResultCache())
+
+
+def thrust(circuit, phase_settings):
+    return circuit.run(phase_settings)
+
+
+def phase_chunk_size(phase_options, workers=None):
+    # About four chunks per worker, so even the 120 permutations of the puzzle are spread over the whole pool
+    workers = workers or os.cpu_count()
+    return max(1, ceil(factorial(len(phase_options)) / (workers * 4)))
+
+
+def parallel_max_phase_setting(program, phase_options, workers=None, chunk_size=None):
+    """
+    calculate_max_phase_setting with the permutations spread over a process pool. Each worker builds one cached
+    circuit and keeps it for all its permutations.
+    :param int -> chunk_size: Permutations per task. By default it's worked out from the permutation and worker counts.
+    :return: (phase settings, thrust)
+    """
+    phase_options = list(phase_options)
+    if chunk_size is None:
+        chunk_size = phase_chunk_size(phase_options, workers)
+    return parallel_maximize(
+        program, permutations(phase_options), thrust, workers=workers, chunk_size=chunk_size,
+        computer_class=cached_circuit
+    )
+
+
 def tests():
     program_1 = [3,15,3,16,1002,16,10,16,1,16,15,15,4,15,99,0,0]
     circuit_1 = AmplifierCircuit(program_1)
@@ -113,7 +138,7 @@ def tests():
     phase_sequence_4 = (9, 8, 7, 6, 5)
     max_thrust_4 = 139629729
     assert circuit_4.run(phase_sequence_4) == max_thrust_4
-    # assert calculate_max_phase_setting(circuit_4, range(5, 10))[0] == phase_sequence_4
+    assert calculate_max_phase_setting(circuit_4, range(5, 10))[0] == phase_sequence_4
     print("Test 4 Passed")
 
     program_5 = [
@@ -125,9 +150,26 @@ def tests():
     phase_sequence_5 = (9, 7, 8, 5, 6)
     max_thrust_5 = 18216
     assert circuit_5.run(phase_sequence_5) == max_thrust_5
-    # assert calculate_max_phase_setting(circuit_5, range(5, 10))[0] == phase_sequence_5
+    assert calculate_max_phase_setting(circuit_5, range(5, 10))[0] == phase_sequence_5
     print("Test 5 Passed")
 
+    # Cached chains give the same answers, and fall back to the network for feedback loops
+    cache = ResultCache()
+    assert calculate_max_phase_setting(AmplifierCircuit(program_3, cache=cache), range(5)) == (
+        phase_sequence_3, max_thrust_3
+    )
+    assert cache.hits > cache.misses
+    assert AmplifierCircuit(program_5, cache=cache).run(phase_sequence_5) == max_thrust_5
+    print("Test 6 Passed")
+
+    # In parallel, including with more amplifiers than phase settings of the original puzzle
+    assert phase_chunk_size(range(5), workers=2) == 15 and phase_chunk_size(range(2), workers=8) == 1
+    assert parallel_max_phase_setting(program_3, range(5), workers=2) == (phase_sequence_3, max_thrust_3)
+    assert parallel_max_phase_setting(program_5, range(5, 10), workers=2) == (phase_sequence_5, max_thrust_5)
+    assert parallel_max_phase_setting(program_1, range(7), workers=2) == ((6, 5, 4, 3, 2, 1, 0), 6543210)
+    assert AmplifierCircuit(program_1).run(range(7)) == 123456
+    print("Test 7 Passed")
+
     print("Tests Done")
 
 
@@ -135,6 +177,5 @@ if __name__ == "__main__":
     tests()
     input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
     program = get_program(input_file)
-    circuit = AmplifierCircuit(program)
-    print(calculate_max_phase_setting(circuit, range(5)))
-    print(calculate_max_phase_setting(circuit, range(5, 10)))
+    print(parallel_max_phase_setting(program, range(5)))
+    print(parallel_max_phase_setting(program, range(5, 10)))
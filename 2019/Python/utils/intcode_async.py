@@ -0,0 +1,127 @@
+import os
+import asyncio
+
+from utils.intcode_computer import IntCodeComputer, get_program, NEED_INPUT, TIME_SLICE_EXPIRED
+
+
+class AsyncIntCodeComputer(IntCodeComputer):
+    """
+    IntCode computer for asyncio. run() is a coroutine, so any number of machines can share one event loop, each
+    only giving up control when it's blocked on I/O or has used up its time slice.
+
+    input_queue/output_queue work as for IntCodeComputer, except that queues are awaited, so asyncio.Queue (bounded
+    or not) is the natural channel between machines. Lists are read from and appended to without waiting.
+    """
+    TIME_SLICE = 10000
+
+    def __init__(self, program, input_queue=None, output_queue=None, name="AsyncIntCodeComputer", debug=False,
+                 log=None, time_slice=None):
+        super().__init__(program, input_queue, output_queue, name=name, debug=debug, log=log)
+        # Instructions to run before letting other tasks have a turn
+        self.time_slice = time_slice or self.TIME_SLICE
+
+    async def run(self, noun=None, verb=None):
+        try:
+            return await self.drive(self.interact(noun, verb, time_slice=self.time_slice))
+        except Exception as e:
+            self.log(str(e))
+
+    async def resume(self):
+        try:
+            return await self.drive(self.interact(resume=True, time_slice=self.time_slice))
+        except Exception as e:
+            self.log(str(e))
+
+    async def drive(self, machine):
+        value = None
+        while True:
+            try:
+                event = machine.send(value)
+            except StopIteration as halted:
+                return halted.value
+            value = None
+            if event == NEED_INPUT:
+                value = await self.read_input()
+            elif event == TIME_SLICE_EXPIRED:
+                await asyncio.sleep(0)
+            else:
+                await self.write_output(event)
+
+    async def read_input(self):
+        if self.input_queue is None:
+            return int(await asyncio.get_running_loop().run_in_executor(None, input, "Input:"))
+        elif hasattr(self.input_queue, 'get'):
+            return await self.input_queue.get()
+        elif hasattr(self.input_queue, 'pop'):
+            return self.input_queue.pop(0)
+        raise RuntimeError("Invalid input configured.")
+
+    async def write_output(self, value):
+        if self.output_queue is None:
+            print("Output:{}".format(value))
+        elif hasattr(self.output_queue, 'put'):
+            await self.output_queue.put(value)
+        elif hasattr(self.output_queue, 'append'):
+            self.output_queue.append(value)
+        else:
+            raise RuntimeError("Invalid output configured.")
+
+
+def tests():
+    comparison_program = [
+        3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+        1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+        999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+    ]
+
+    async def single():
+        outputs = []
+        await AsyncIntCodeComputer(comparison_program, [9], outputs).run()
+        assert outputs == [1001]
+    asyncio.run(single())
+
+    # Day 7 feedback loop with 5 machines on one event loop, connected by asyncio.Queues
+    feedback_program = [
+        3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27,
+        4, 27, 1001, 28, -1, 28, 1005, 28, 6, 99, 0, 0, 5
+    ]
+
+    async def feedback_loop(phase_settings):
+        channels = [asyncio.Queue(2) for _ in phase_settings]
+        for channel, phase_setting in zip(channels, phase_settings):
+            channel.put_nowait(phase_setting)
+        channels[0].put_nowait(0)
+        amplifiers = [
+            AsyncIntCodeComputer(feedback_program, channels[i], channels[(i + 1) % len(channels)])
+            for i in range(len(channels))
+        ]
+        await asyncio.gather(*(amplifier.run() for amplifier in amplifiers))
+        return channels[0].get_nowait()
+    assert asyncio.run(feedback_loop((9, 8, 7, 6, 5))) == 139629729
+
+    # A long running machine doesn't starve a machine that is ready to go
+    countdown = [1101, 0, 100000, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    finished = []
+
+    async def tracked(name, computer):
+        await computer.run()
+        finished.append(name)
+
+    async def race():
+        await asyncio.gather(
+            tracked("slow", AsyncIntCodeComputer(countdown, [], [], time_slice=1000)),
+            tracked("fast", AsyncIntCodeComputer(comparison_program, [8], [])),
+        )
+    asyncio.run(race())
+    assert finished == ["fast", "slow"]
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+    program = get_program(input_file)
+
+    asyncio.run(AsyncIntCodeComputer(program).run())
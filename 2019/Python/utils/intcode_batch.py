@@ -0,0 +1,221 @@
+import os
+from collections import defaultdict
+
+from utils.intcode_computer import IntCodeComputer, get_program, decode_opcode, POSITION_MODE, IMMEDIATE_MODE
+
+
+class BatchIntCodeComputer:
+    """
+    Runs many instances of the same program in lockstep.
+
+    Memory is stored by column: address -> list holding that address's value in every instance. Each tick the running
+    instances are grouped by instruction pointer (and opcode, in case an instance has rewritten its code), the
+    instruction is decoded once per group and then applied to the whole group with list comprehensions instead of one
+    interpreter step per instance. Instances that take different branches simply end up in different groups.
+
+    Values are plain Python ints, so there is no overflow to fall back from.
+    """
+
+    def __init__(self, program, patches=None, inputs=None, instances=None):
+        """
+        :param List[int] -> program:
+        :param List[Dict[int, int]] -> patches: Memory changes (address -> value) to apply to each instance
+        :param List[List[int]] -> inputs: Input values for each instance
+        :param int -> instances: Number of instances. Only needed if neither patches nor inputs is given.
+        """
+        if instances is None:
+            instances = len(patches) if patches is not None else len(inputs)
+        self.instances = instances
+        self.zero_column = (0,) * instances
+        self.memory = {address: [value] * instances for address, value in enumerate(program)}
+        for instance, instance_patches in enumerate(patches or ()):
+            for address, value in instance_patches.items():
+                self.writable_column(address)[instance] = value
+        self.inputs = [list(values) for values in inputs] if inputs is not None else [[] for _ in range(instances)]
+        self.outputs = [[] for _ in range(instances)]
+        self.instruction_pointers = [0] * instances
+        self.relative_bases = [0] * instances
+        self.running = [True] * instances
+        # Instance -> the exception that stopped it
+        self.errors = {}
+
+    def column(self, address):
+        if address < 0:
+            raise IndexError("Negative address {}".format(address))
+        return self.memory.get(address, self.zero_column)
+
+    def writable_column(self, address):
+        column = self.memory.get(address)
+        if column is None:
+            if address < 0:
+                raise IndexError("Negative address {}".format(address))
+            column = [0] * self.instances
+            self.memory[address] = column
+        return column
+
+    def read(self, address):
+        # The value at address in every instance
+        return list(self.column(address))
+
+    def instance_memory(self, instance):
+        return [self.memory.get(address, self.zero_column)[instance] for address in range(max(self.memory) + 1)]
+
+    def run(self):
+        while True:
+            groups = defaultdict(list)
+            for instance, instruction_pointer in enumerate(self.instruction_pointers):
+                if self.running[instance]:
+                    groups[instruction_pointer].append(instance)
+            if not groups:
+                break
+            for instruction_pointer, members in groups.items():
+                opcodes = self.column(instruction_pointer)
+                # Almost always every member has the same opcode, but self modifying code can split a group
+                by_opcode = defaultdict(list)
+                for instance in members:
+                    by_opcode[opcodes[instance]].append(instance)
+                for opcode, opcode_members in by_opcode.items():
+                    try:
+                        self.execute(instruction_pointer, opcode, opcode_members)
+                    except Exception:
+                        # Nothing is changed before an error is raised, so redo the group one instance at a time to
+                        # only stop the instances that actually failed.
+                        for instance in opcode_members:
+                            try:
+                                self.execute(instruction_pointer, opcode, [instance])
+                            except Exception as e:
+                                self.running[instance] = False
+                                self.errors[instance] = e
+        return self.outputs
+
+    def execute(self, instruction_pointer, opcode, members):
+        code, input_modes = decode_opcode(opcode)
+        addresses = [
+            self.resolve(mode, instruction_pointer + offset, members)
+            for offset, (mode, _) in enumerate(input_modes, start=1)
+        ]
+        next_instruction_pointer = instruction_pointer + 1 + len(input_modes)
+
+        if code in (1, 2, 7, 8):
+            x, y = self.values(addresses[0], members), self.values(addresses[1], members)
+            if code == 1:
+                result = [a + b for a, b in zip(x, y)]
+            elif code == 2:
+                result = [a * b for a, b in zip(x, y)]
+            elif code == 7:
+                result = [1 if a < b else 0 for a, b in zip(x, y)]
+            else:
+                result = [1 if a == b else 0 for a, b in zip(x, y)]
+            self.store(addresses[2], members, result)
+        elif code == 3:
+            if not all(self.inputs[instance] for instance in members):
+                raise RuntimeError("Input required but none available.")
+            self.store(addresses[0], members, [self.inputs[instance].pop(0) for instance in members])
+        elif code == 4:
+            for instance, value in zip(members, self.values(addresses[0], members)):
+                self.outputs[instance].append(value)
+        elif code in (5, 6):
+            tests = self.values(addresses[0], members)
+            jumps = self.values(addresses[1], members)
+            for instance, test, jump in zip(members, tests, jumps):
+                if bool(test) == (code == 5):
+                    self.instruction_pointers[instance] = jump
+                else:
+                    self.instruction_pointers[instance] = next_instruction_pointer
+            return
+        elif code == 9:
+            for instance, value in zip(members, self.values(addresses[0], members)):
+                self.relative_bases[instance] += value
+        else:
+            for instance in members:
+                self.running[instance] = False
+            return
+
+        for instance in members:
+            self.instruction_pointers[instance] = next_instruction_pointer
+
+    def resolve(self, mode, address, members):
+        """
+        Resolve the parameter stored at address for each member.
+        Returns a single address when it's the same for every member, otherwise a list with an address per member.
+        """
+        if mode == IMMEDIATE_MODE:
+            return address
+        words = self.column(address)
+        if mode == POSITION_MODE:
+            first = words[members[0]]
+            if all(words[instance] == first for instance in members):
+                return first
+            return [words[instance] for instance in members]
+        relative_bases = self.relative_bases
+        return [relative_bases[instance] + words[instance] for instance in members]
+
+    def values(self, address, members):
+        if isinstance(address, int):
+            column = self.column(address)
+            if len(members) == self.instances:
+                return column
+            return [column[instance] for instance in members]
+        return [self.column(each)[instance] for each, instance in zip(address, members)]
+
+    def store(self, address, members, values):
+        if isinstance(address, int):
+            if len(members) == self.instances:
+                if address < 0:
+                    raise IndexError("Negative address {}".format(address))
+                self.memory[address] = values
+            else:
+                column = self.writable_column(address)
+                for instance, value in zip(members, values):
+                    column[instance] = value
+        else:
+            if min(address) < 0:
+                raise IndexError("Negative address {}".format(min(address)))
+            for each, instance, value in zip(address, members, values):
+                self.writable_column(each)[instance] = value
+
+
+def tests():
+    # Every noun/verb pair for a small Day 2 style program in one batch
+    program = [1, 0, 0, 3, 1, 1, 2, 3, 1, 3, 4, 3, 1, 5, 0, 3, 2, 1, 10, 19, 1, 19, 5, 23, 99]
+    patches = [{1: noun, 2: verb} for noun in range(20) for verb in range(20)]
+    batch = BatchIntCodeComputer(program, patches)
+    batch.run()
+    results = batch.read(0)
+    for instance, instance_patches in enumerate(patches):
+        expected = IntCodeComputer(program).run(noun=instance_patches[1], verb=instance_patches[2])
+        assert results[instance] == expected[0]
+        assert batch.instance_memory(instance)[:len(expected)] == expected
+
+    # Instances that branch differently
+    program = [
+        3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+        1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+        999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+    ]
+    batch = BatchIntCodeComputer(program, inputs=[[6], [7], [8], [], [9], [10]])
+    assert batch.run() == [[999], [999], [1000], [], [1001], [1001]]
+    assert list(batch.errors) == [3]
+
+    # Relative mode, large values and an instance that fails without stopping the others
+    quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+    batch = BatchIntCodeComputer(quine, patches=[{}, {1: -5}])
+    outputs = batch.run()
+    assert outputs[0] == quine
+    assert 1 in batch.errors and 0 not in batch.errors
+
+    batch = BatchIntCodeComputer([1102, 34915192, 34915192, 7, 4, 7, 99, 0], instances=3)
+    assert batch.run() == [[1219070632396864]] * 3
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+    program = get_program(input_file)
+
+    batch = BatchIntCodeComputer(program, [{1: noun, 2: verb} for noun in range(100) for verb in range(100)])
+    batch.run()
+    print(batch.read(0))
@@ -0,0 +1,259 @@
+import sys
+import json
+import time
+import asyncio
+import platform
+import subprocess
+import tracemalloc
+
+from utils.intcode_computer import IntCodeComputer, TypedIntCodeComputer
+from utils.intcode_jit import CompiledIntCodeComputer
+from utils.intcode_async import AsyncIntCodeComputer
+from utils.intcode_batch import BatchIntCodeComputer
+from utils.intcode_profiler import ProfilingIntCodeComputer
+from utils.intcode_trace import TracingIntCodeComputer
+
+
+COMPARISON_PROGRAM = [
+    3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+    1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+    999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+]
+QUINE = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+
+
+def countdown(n):
+    # Count [100] down from n to 0, then output it
+    return [1101, 0, n, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+
+
+def relative_sum(n):
+    # Sum n..1 in two relative mode variables, then output the sum
+    return [109, 1000, 21101, 0, n, 0, 22201, 0, 1, 1, 21201, 0, -1, 0, 1205, 0, 6, 204, 1, 99]
+
+
+# Name -> (program, inputs, expected outputs)
+BENCHMARKS = {
+    "day2_add": ([1, 9, 10, 3, 2, 3, 11, 0, 99, 30, 40, 50], [], []),
+    "day2_multiply": ([2, 4, 4, 5, 99, 0], [], []),
+    "day5_compare_below": (COMPARISON_PROGRAM, [7], [999]),
+    "day5_compare_equal": (COMPARISON_PROGRAM, [8], [1000]),
+    "day5_jump": ([3, 3, 1105, -1, 9, 1101, 0, 0, 12, 4, 12, 99, 1], [5], [1]),
+    "day9_quine": (QUINE, [], QUINE),
+    "day9_16_digit_multiply": ([1102, 34915192, 34915192, 7, 4, 7, 99, 0], [], [1219070632396864]),
+    "day9_large_number": ([104, 1125899906842624, 99], [], [1125899906842624]),
+    "countdown_loop": (countdown(100000), [], [0]),
+    "relative_sum_loop": (relative_sum(50000), [], [50000 * 50001 // 2]),
+}
+
+# Instances run side by side by the batch engine
+BATCH_SIZE = 10
+
+
+def computer_runner(computer_class):
+    # One machine, rebooted for every run, so caches (decoded instructions, compiled blocks) carry over between runs
+    def make(program, inputs):
+        computer = computer_class(program, [], [])
+
+        def run():
+            computer.input_queue = list(inputs)
+            computer.output_queue = []
+            computer.boot()
+            computer.execute()
+            return computer.output_queue
+        return run
+    return make
+
+
+def async_runner(program, inputs):
+    computer = AsyncIntCodeComputer(program, [], [])
+
+    def run():
+        computer.input_queue = list(inputs)
+        computer.output_queue = []
+        asyncio.run(computer.drive(computer.interact(time_slice=computer.time_slice)))
+        return computer.output_queue
+    return run
+
+
+def batch_runner(program, inputs):
+    # The batch engine is single use, so every run builds a new one
+    def run():
+        batch = BatchIntCodeComputer(program, inputs=[inputs] * BATCH_SIZE)
+        outputs = batch.run()
+        if batch.errors:
+            raise next(iter(batch.errors.values()))
+        return outputs[0]
+    return run
+
+
+# Name -> (runner factory, instances per run)
+ENGINES = {
+    "interpreter": (computer_runner(IntCodeComputer), 1),
+    "typed": (computer_runner(TypedIntCodeComputer), 1),
+    "jit": (computer_runner(CompiledIntCodeComputer), 1),
+    "async": (async_runner, 1),
+    "batch": (batch_runner, BATCH_SIZE),
+    "profiler": (computer_runner(ProfilingIntCodeComputer), 1),
+    "trace": (computer_runner(TracingIntCodeComputer), 1),
+}
+
+
+def count_instructions(program, inputs):
+    computer = IntCodeComputer(program, list(inputs), [])
+    computer.boot()
+    return computer.execute()
+
+
+def run_benchmark(engine, benchmark, min_time=0.2, max_runs=10000):
+    """
+    Time one benchmark on one engine. Runs are repeated until they have taken at least min_time in total.
+
+    startup_seconds is what the first run costs over a warmed up run, plus building the engine, i.e. the one off cost
+    of decoding/compiling. peak_memory_bytes is the peak traced allocation while building the engine and running it
+    once.
+    :return Dict: JSON serialisable results
+    """
+    make_runner, instances = ENGINES[engine]
+    program, inputs, expected = BENCHMARKS[benchmark]
+    instructions = count_instructions(program, inputs) * instances
+
+    tracemalloc.start()
+    try:
+        outputs = make_runner(program, inputs)()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if outputs != expected:
+        raise AssertionError("{} gave {} for {}, expected {}".format(engine, outputs, benchmark, expected))
+
+    start = time.perf_counter()
+    run = make_runner(program, inputs)
+    run()
+    cold_seconds = time.perf_counter() - start
+
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        run()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or runs >= max_runs:
+            break
+    seconds = elapsed / runs
+
+    return {
+        "benchmark": benchmark,
+        "engine": engine,
+        "instructions": instructions,
+        "runs": runs,
+        "seconds": seconds,
+        "instructions_per_second": instructions / seconds if seconds else 0.0,
+        "startup_seconds": max(cold_seconds - seconds, 0.0),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(engines=None, benchmarks=None, min_time=0.2):
+    """
+    :return Dict: Every benchmark on every engine, tagged with the commit and Python version so results files from
+        different commits can be compared with compare().
+    """
+    results = []
+    for benchmark in benchmarks or BENCHMARKS:
+        for engine in engines or ENGINES:
+            results.append(run_benchmark(engine, benchmark, min_time=min_time))
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    :return List[Dict]: The benchmark/engine pairs whose instructions per second dropped by more than tolerance
+        (a fraction) between the baseline and current suite results.
+    """
+    baseline_speeds = {
+        (result["benchmark"], result["engine"]): result["instructions_per_second"] for result in baseline["results"]
+    }
+    regressions = []
+    for result in current["results"]:
+        before = baseline_speeds.get((result["benchmark"], result["engine"]))
+        if before and result["instructions_per_second"] < before * (1 - tolerance):
+            regressions.append({
+                "benchmark": result["benchmark"],
+                "engine": result["engine"],
+                "before": before,
+                "after": result["instructions_per_second"],
+                "change": result["instructions_per_second"] / before - 1,
+            })
+    return regressions
+
+
+def format_results(suite):
+    lines = ["{:<24} {:<12} {:>12} {:>14} {:>12} {:>12} {:>10}".format(
+        "benchmark", "engine", "instructions", "instr/s", "seconds", "startup", "peak KiB"
+    )]
+    for result in suite["results"]:
+        lines.append("{:<24} {:<12} {:>12} {:>14,.0f} {:>12.6f} {:>12.6f} {:>10.1f}".format(
+            result["benchmark"], result["engine"], result["instructions"], result["instructions_per_second"],
+            result["seconds"], result["startup_seconds"], result["peak_memory_bytes"] / 1024
+        ))
+    return "\n".join(lines)
+
+
+def tests():
+    assert count_instructions(*BENCHMARKS["countdown_loop"][:2]) == 100000 * 2 + 3
+    assert count_instructions(*BENCHMARKS["relative_sum_loop"][:2]) == 50000 * 3 + 4
+
+    suite = run_suite(benchmarks=["day5_compare_equal", "day9_quine"], min_time=0)
+    assert len(suite["results"]) == 2 * len(ENGINES)
+    for result in suite["results"]:
+        assert result["runs"] == 1
+        assert result["instructions_per_second"] > 0
+        assert result["peak_memory_bytes"] > 0
+    batch_result = [result for result in suite["results"] if result["engine"] == "batch"][0]
+    assert batch_result["instructions"] == BATCH_SIZE * count_instructions(COMPARISON_PROGRAM, [8])
+    json.dumps(suite)
+
+    # Only drops beyond the tolerance count as regressions
+    slower = json.loads(json.dumps(suite))
+    slower["results"][0]["instructions_per_second"] *= 0.5
+    slower["results"][1]["instructions_per_second"] *= 0.95
+    regressions = compare(suite, slower)
+    assert [(regression["benchmark"], regression["engine"]) for regression in regressions] == [
+        (slower["results"][0]["benchmark"], slower["results"][0]["engine"])
+    ]
+    assert abs(regressions[0]["change"] + 0.5) < 1e-9
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    # python -m utils.intcode_benchmark [results.json] [baseline.json]
+    suite = run_suite()
+    print(format_results(suite))
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as f:
+            json.dump(suite, f, indent=2)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            baseline = json.load(f)
+        for regression in compare(baseline, suite):
+            print("Regression: {benchmark} on {engine} {change:.1%} ({before:,.0f} -> {after:,.0f} instr/s)".format(
+                **regression
+            ))
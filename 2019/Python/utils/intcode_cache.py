@@ -0,0 +1,209 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict, namedtuple
+
+from utils.intcode_computer import IntCodeComputer, NEED_INPUT
+
+
+# outputs: every value output. memory: the final memory. halted: False if the run stopped because it wanted more input
+# than it was given (e.g. a Day 7 amplifier in a feedback loop).
+RunResult = namedtuple("RunResult", ["outputs", "memory", "halted"])
+
+
+def program_digest(program):
+    return hashlib.sha256(",".join(map(str, program)).encode()).hexdigest()
+
+
+def run_patched(computer, patches=None, inputs=()):
+    """
+    Reset computer, make the memory changes in patches (address -> value) and run it on inputs until it halts or
+    wants more input than that.
+    :return RunResult: memory is a fork of the computer's memory, so making it costs a copy of the page table
+    """
+    computer.reset(patches)
+
+    outputs = []
+    halted = False
+    machine = computer.interact(resume=True)
+    remaining = iter(inputs)
+    value = None
+    try:
+        while True:
+            event = machine.send(value)
+            value = None
+            if event == NEED_INPUT:
+                value = next(remaining, None)
+                if value is None:
+                    break
+            else:
+                outputs.append(event)
+    except StopIteration:
+        halted = True
+    finally:
+        machine.close()
+    return RunResult(tuple(outputs), computer.program_memory.fork(), halted)
+
+
+class ResultCache:
+    """
+    Memoizes deterministic IntCode runs, keyed by (program hash, memory patches, inputs).
+
+    Results live in a bounded in-memory LRU, and optionally in a directory as well (one JSON file per run), so repeats
+    are free across processes too. A run that asks for more input than it was given stops there rather than failing,
+    and that is cached like any other result. Errors are raised and not cached. Results are shared between hits, so
+    treat their memory as read only.
+    """
+
+    def __init__(self, max_entries=4096, directory=None, computer_class=IntCodeComputer, max_computers=16):
+        self.max_entries = max_entries
+        self.max_computers = max_computers
+        self.directory = directory
+        self.computer_class = computer_class
+        self.entries = OrderedDict()
+        # Program digest -> computer, so engines with caches of their own (e.g. compiled blocks) keep them. Least
+        # recently used first, like entries.
+        self.computers = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(digest, patches, inputs):
+        patches = sorted((patches or {}).items())
+        return hashlib.sha256(json.dumps([digest, patches, list(inputs)]).encode()).hexdigest()
+
+    def run(self, program, patches=None, inputs=()):
+        """
+        :param List[int] -> program:
+        :param Dict[int, int] -> patches: Memory changes (address -> value) to make before running, e.g. noun and verb
+        :param Iterable[int] -> inputs:
+        :return RunResult:
+        """
+        inputs = tuple(inputs)
+        digest = program_digest(program)
+        key = self.key(digest, patches, inputs)
+
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+        result = self.load(key)
+        if result is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            result = self.execute(digest, program, patches, inputs)
+            self.save(key, result)
+        self.entries[key] = result
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result
+
+    def execute(self, digest, program, patches, inputs):
+        computer = self.computers.get(digest)
+        if computer is None:
+            computer = self.computer_class(program, name="Cached {}".format(digest[:8]))
+            self.computers[digest] = computer
+            if len(self.computers) > self.max_computers:
+                self.computers.popitem(last=False)
+        else:
+            self.computers.move_to_end(digest)
+        return run_patched(computer, patches, inputs)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key)) as f:
+                data = json.load(f)
+            memory = self.computer_class.memory_class.from_page_map(data["pages"], data["length"])
+        except (OSError, ValueError, KeyError):
+            return None
+        return RunResult(tuple(data["outputs"]), memory, data["halted"])
+
+    def save(self, key, result):
+        if self.directory is None:
+            return
+        temporary_path = "{}.{}.tmp".format(self.path(key), os.getpid())
+        try:
+            with open(temporary_path, "w") as f:
+                json.dump({
+                    "outputs": result.outputs, "pages": result.memory.page_map(), "length": len(result.memory),
+                    "halted": result.halted
+                }, f)
+            os.replace(temporary_path, self.path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        # Only the in-memory tier. Delete the directory to clear the disk tier.
+        self.entries.clear()
+
+
+def tests():
+    import time
+    import tempfile
+
+    day_2_program = [1, 0, 0, 3, 1, 1, 2, 3, 1, 3, 4, 3, 1, 5, 0, 3, 2, 1, 10, 19, 1, 19, 5, 23, 99]
+    cache = ResultCache(max_entries=2)
+    first = cache.run(day_2_program, {1: 12, 2: 2})
+    assert first.memory == tuple(IntCodeComputer(day_2_program).run(noun=12, verb=2))
+    assert first.halted and first.outputs == ()
+    assert cache.run(day_2_program, {2: 2, 1: 12}) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Least recently used entries are dropped first
+    cache.run(day_2_program, {1: 0, 2: 0})
+    cache.run(day_2_program, {1: 12, 2: 2})
+    cache.run(day_2_program, {1: 1, 2: 1})
+    assert cache.run(day_2_program, {1: 12, 2: 2}) is first
+    cache.run(day_2_program, {1: 0, 2: 0})
+    assert (cache.hits, cache.misses) == (3, 4)
+
+    # Machines are kept per program, bounded the same way
+    cache = ResultCache(max_computers=2)
+    programs = [[104, value, 99] for value in range(3)]
+    for program, patches in ((programs[0], None), (programs[1], None), (programs[0], {1: 5}), (programs[2], None)):
+        cache.run(program, patches)
+    assert list(cache.computers) == [program_digest(programs[0]), program_digest(programs[2])]
+
+    # Inputs are part of the key, and running out of input is a result too
+    comparison_program = [
+        3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+        1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+        999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+    ]
+    cache = ResultCache()
+    assert cache.run(comparison_program, inputs=[7]).outputs == (999,)
+    assert cache.run(comparison_program, inputs=[8]).outputs == (1000,)
+    assert not cache.run(comparison_program).halted
+
+    # The disk tier is shared between caches
+    with tempfile.TemporaryDirectory() as directory:
+        quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+        assert ResultCache(directory=directory).run(quine).outputs == tuple(quine)
+        cache = ResultCache(directory=directory)
+        assert cache.run(quine).outputs == tuple(quine)
+        assert (cache.disk_hits, cache.misses) == (1, 0)
+
+        # A write to a huge address only costs the pages it touches, in memory and on disk
+        start = time.perf_counter()
+        far_write = [1101, 1, 2, 10 ** 9, 99]
+        result = ResultCache(directory=directory).run(far_write)
+        assert result.memory[10 ** 9] == 3 and len(result.memory) == 10 ** 9 + 1
+        assert ResultCache(directory=directory).run(far_write) == result
+        assert run_patched(IntCodeComputer(far_write)) == result
+        assert time.perf_counter() - start < 1
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
@@ -0,0 +1,427 @@
+import queue
+import threading
+
+
+# How often a blocked read or write on a queue.Queue checks its CancellationToken, in seconds
+POLL_INTERVAL = 0.01
+
+
+class Cancelled(Exception):
+    # Raised out of a blocking read or write when its CancellationToken is cancelled
+    pass
+
+
+class CancellationToken:
+    """
+    Shared stop flag for machines running in threads. Reads and writes blocked on a channel through get/put with this
+    token raise Cancelled once it's cancelled: straight away on a RingChannel, and within POLL_INTERVAL on a
+    queue.Queue.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.lock = threading.Lock()
+        # Wake-up callbacks of the reads and writes with this token that are currently blocked
+        self.waiting = set()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            waiting = list(self.waiting)
+        for wake in waiting:
+            wake()
+
+    def reset(self):
+        # Make the token usable again, e.g. for the next run of a machine that was cancelled
+        with self.lock:
+            self.cancelled = False
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def block(self, wait, wake):
+        # Call wait() to block, after checking for a cancel. The flag is set before wake() is called, so a cancel
+        # landing between the check and wait() still wakes it.
+        with self.lock:
+            self.waiting.add(wake)
+        try:
+            self.check()
+            wait()
+        finally:
+            with self.lock:
+                self.waiting.discard(wake)
+
+    def wait_event(self, event):
+        self.block(event.wait, event.set)
+
+
+class RingChannel:
+    """
+    Channel for exactly one producer thread and one consumer thread: a preallocated ring buffer whose read and write
+    positions are each only moved by one side, so passing values takes no lock.
+
+    A side only sleeps (on an Event) when the ring is empty or full, and the other side only signals that Event when
+    it knows someone is asleep on it, so a steady stream of values costs no wakeups. A full ring blocks the producer,
+    which stops a fast machine running arbitrarily far ahead of its consumer.
+
+    Relies on the GIL making each read and write of the positions atomic and ordered.
+    """
+
+    def __init__(self, capacity=1024):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.capacity = size
+        self.mask = size - 1
+        self.buffer = [0] * size
+        # Counts of values ever read and written. Only the consumer moves head, only the producer moves tail.
+        self.head = 0
+        self.tail = 0
+        self.readable = threading.Event()
+        self.writable = threading.Event()
+        self.reader_waiting = False
+        self.writer_waiting = False
+
+    @property
+    def maxsize(self):
+        return self.capacity
+
+    @property
+    def queue(self):
+        # The values waiting to be read, as for queue.Queue
+        return [self.buffer[i & self.mask] for i in range(self.head, self.tail)]
+
+    def qsize(self):
+        return self.tail - self.head
+
+    def empty(self):
+        return self.tail == self.head
+
+    def full(self):
+        return self.tail - self.head == self.capacity
+
+    def wait_readable(self, token):
+        while self.tail == self.head:
+            self.readable.clear()
+            self.reader_waiting = True
+            # The producer may have written between the test above and the flag being set, so test again
+            if self.tail != self.head:
+                break
+            if token is None:
+                self.readable.wait()
+            else:
+                token.wait_event(self.readable)
+        self.reader_waiting = False
+
+    def wait_writable(self, token):
+        while self.tail - self.head == self.capacity:
+            self.writable.clear()
+            self.writer_waiting = True
+            if self.tail - self.head != self.capacity:
+                break
+            if token is None:
+                self.writable.wait()
+            else:
+                token.wait_event(self.writable)
+        self.writer_waiting = False
+
+    def put(self, value, token=None):
+        tail = self.tail
+        if tail - self.head == self.capacity:
+            self.wait_writable(token)
+        self.buffer[tail & self.mask] = value
+        self.tail = tail + 1
+        if self.reader_waiting:
+            self.readable.set()
+
+    def get(self, token=None):
+        head = self.head
+        if head == self.tail:
+            self.wait_readable(token)
+        value = self.buffer[head & self.mask]
+        self.head = head + 1
+        if self.writer_waiting:
+            self.writable.set()
+        return value
+
+    def put_nowait(self, value):
+        if self.full():
+            raise queue.Full
+        self.put(value)
+
+    def get_nowait(self):
+        if self.empty():
+            raise queue.Empty
+        return self.get()
+
+    def put_many(self, values, token=None):
+        # Write values in as few steps as there's room for, blocking while the ring is full
+        values = list(values)
+        written = 0
+        while written < len(values):
+            free = self.capacity - (self.tail - self.head)
+            if not free:
+                self.wait_writable(token)
+                continue
+            count = min(free, len(values) - written)
+            start = self.tail & self.mask
+            first = min(count, self.capacity - start)
+            self.buffer[start:start + first] = values[written:written + first]
+            self.buffer[:count - first] = values[written + first:written + count]
+            self.tail += count
+            written += count
+            if self.reader_waiting:
+                self.readable.set()
+
+    def get_many(self, count, token=None):
+        # Read exactly count values, blocking until they've all been written
+        values = []
+        while len(values) < count:
+            available = self.tail - self.head
+            if not available:
+                self.wait_readable(token)
+                continue
+            available = min(available, count - len(values))
+            start = self.head & self.mask
+            first = min(available, self.capacity - start)
+            values += self.buffer[start:start + first]
+            values += self.buffer[:available - first]
+            self.head += available
+            if self.writer_waiting:
+                self.writable.set()
+        return values
+
+
+class OutputSink:
+    """
+    Output channel that hands values to a callback in groups of arity values (e.g. Day 13's x, y, tile) rather than
+    one at a time, so the consumer never polls or reassembles them itself.
+
+    Unbatched, callback(*group) is called as each group completes. Batched, complete groups are held until the
+    machine next wants input or halts, and then callback(groups) gets all of them in one call, e.g. a whole frame of
+    screen updates. With an arity of 1 a group is just the value.
+    """
+
+    def __init__(self, callback, arity=1, batched=False):
+        self.callback = callback
+        self.arity = arity
+        self.batched = batched
+        # Values of the group being built
+        self.pending = []
+        # Complete groups waiting for the next flush, when batched
+        self.groups = []
+
+    @property
+    def queue(self):
+        # The values written but not yet delivered
+        values = []
+        for group in self.groups:
+            values += group if self.arity > 1 else [group]
+        return values + self.pending
+
+    def put(self, value):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) < self.arity:
+            return
+        self.pending = []
+        if not self.batched:
+            self.callback(*pending)
+        elif self.arity == 1:
+            self.groups.append(value)
+        else:
+            self.groups.append(tuple(pending))
+
+    def flush(self):
+        if self.groups:
+            groups = self.groups
+            self.groups = []
+            self.callback(groups)
+
+
+def get(channel, token=None):
+    """
+    Blocking read from a queue.Queue or RingChannel that gives up if token is cancelled. Values already waiting are
+    still returned after a cancel, so nothing the other end wrote before stopping is lost.
+    A RingChannel wakes as soon as the token is cancelled. A queue.Queue has no public way to be woken, so it's polled
+    every POLL_INTERVAL; use a RingChannel where a cancel has to land straight away. Other channels are read with
+    their own get().
+    """
+    if channel.__class__ is RingChannel:
+        return channel.get(token)
+    if token is None or not isinstance(channel, queue.Queue):
+        return channel.get()
+    while True:
+        try:
+            return channel.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            token.check()
+
+
+def put(channel, value, token=None):
+    # Blocking write that gives up if token is cancelled while the channel is full. See get.
+    if channel.__class__ is RingChannel:
+        return channel.put(value, token)
+    if token is None or not isinstance(channel, queue.Queue):
+        return channel.put(value)
+    while True:
+        try:
+            return channel.put(value, timeout=POLL_INTERVAL)
+        except queue.Full:
+            token.check()
+
+
+def tests():
+    import time
+
+    # Values are passed as usual
+    channel = queue.Queue(2)
+    token = CancellationToken()
+    put(channel, 1, token)
+    put(channel, 2, token)
+    assert get(channel, token) == 1
+    assert channel.get_nowait() == 2
+
+    def blocked(operation, *args):
+        errors = []
+
+        def target():
+            try:
+                operation(*args)
+            except Cancelled as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        return thread, errors
+
+    # A blocked read and a blocked write both wake as soon as the token is cancelled
+    full_channel = queue.Queue(1)
+    full_channel.put(0)
+    reader, read_errors = blocked(get, queue.Queue(), token)
+    writer, write_errors = blocked(put, full_channel, 1, token)
+    time.sleep(0.05)
+    assert reader.is_alive() and writer.is_alive()
+    start = time.perf_counter()
+    token.cancel()
+    reader.join(1)
+    writer.join(1)
+    assert not reader.is_alive() and not writer.is_alive()
+    assert time.perf_counter() - start < 0.5
+    assert len(read_errors) == 1 and len(write_errors) == 1
+
+    # Once cancelled, only reads and writes that would block fail
+    channel = queue.Queue()
+    put(channel, 5, token)
+    assert get(channel, token) == 5
+    try:
+        get(channel, token)
+    except Cancelled:
+        pass
+    else:
+        raise AssertionError("Expected the read to be cancelled")
+
+    # Reset, the token can be used again
+    token.reset()
+    channel = queue.Queue()
+    reader, read_errors = blocked(get, channel, token)
+    channel.put(6)
+    reader.join(1)
+    assert not reader.is_alive() and not read_errors
+
+    # Ring channels: order is kept across wraparound, in single values and in bulk
+    ring = RingChannel(3)
+    assert ring.capacity == 4
+    for value in range(3):
+        ring.put(value)
+    assert [ring.get(), ring.get()] == [0, 1]
+    ring.put_many([3, 4, 5])
+    assert ring.full() and ring.queue == [2, 3, 4, 5]
+    try:
+        ring.put_nowait(6)
+    except queue.Full:
+        pass
+    else:
+        raise AssertionError("Expected the ring to be full")
+    assert ring.get_many(3) == [2, 3, 4] and ring.get_nowait() == 5 and ring.empty()
+
+    # More values than fit, so the producer is held back until the consumer catches up
+    ring = RingChannel(8)
+    values = list(range(1000))
+    producer = threading.Thread(target=ring.put_many, args=(values,))
+    producer.start()
+    assert ring.get_many(500) == values[:500]
+    assert [ring.get() for _ in range(500)] == values[500:]
+    producer.join(1)
+    assert not producer.is_alive() and ring.empty()
+
+    # Blocked ring reads and writes wake on cancel too
+    token = CancellationToken()
+    full_ring = RingChannel(1)
+    full_ring.put(0)
+    reader, read_errors = blocked(RingChannel().get, token)
+    writer, write_errors = blocked(full_ring.put, 1, token)
+    time.sleep(0.05)
+    assert reader.is_alive() and writer.is_alive()
+    token.cancel()
+    reader.join(1)
+    writer.join(1)
+    assert not reader.is_alive() and not writer.is_alive()
+    assert len(read_errors) == 1 and len(write_errors) == 1
+
+    # Day 7 part 2: a feedback loop of amplifiers, each in its own thread, connected by rings
+    from utils.intcode_computer import IntCodeComputer
+    program = [
+        3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27,
+        4, 27, 1001, 28, -1, 28, 1005, 28, 6, 99, 0, 0, 5
+    ]
+    channels = [RingChannel(2) for _ in range(5)]
+    for channel, phase_setting in zip(channels, (9, 8, 7, 6, 5)):
+        channel.put(phase_setting)
+    channels[0].put(0)
+    amplifiers = [
+        IntCodeComputer(program, channels[i], channels[(i + 1) % 5], name="Amp {}".format(i)) for i in range(5)
+    ]
+    threads = [threading.Thread(target=amplifier.run) for amplifier in amplifiers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert channels[0].queue == [139629729]
+
+    # Pending values survive a fork
+    computer = IntCodeComputer([3, 5, 4, 5, 99, 0], RingChannel(), RingChannel())
+    computer.input_queue.put(42)
+    computer.boot()
+    child = computer.fork()
+    child.resume()
+    assert child.output_queue.queue == [42] and computer.input_queue.queue == [42]
+
+    # Output sinks. Outputs (1, 2, 3) and (4, 5, 6), reads, outputs (7, 8, 9) and halts.
+    program = [104, 1, 104, 2, 104, 3, 104, 4, 104, 5, 104, 6, 3, 100, 104, 7, 104, 8, 104, 9, 99]
+    calls = []
+    IntCodeComputer(program, [0], OutputSink(lambda *group: calls.append(group), arity=3)).run()
+    assert calls == [(1, 2, 3), (4, 5, 6), (7, 8, 9)]
+    calls = []
+    IntCodeComputer(program, [0], OutputSink(calls.append, arity=3, batched=True)).run()
+    assert calls == [[(1, 2, 3), (4, 5, 6)], [(7, 8, 9)]]
+    calls = []
+    IntCodeComputer(program, [0], OutputSink(calls.append, batched=True)).run()
+    assert calls == [[1, 2, 3, 4, 5, 6], [7, 8, 9]]
+
+    # Undelivered output is pending output for a fork
+    calls = []
+    computer = IntCodeComputer(program, [0], OutputSink(calls.append, arity=3, batched=True))
+    computer.boot()
+    computer.execute(budget=5)
+    assert computer.output_queue.queue == [1, 2, 3, 4, 5]
+    child = computer.fork()
+    child.resume()
+    assert calls == [[(1, 2, 3), (4, 5, 6)], [(7, 8, 9)]]
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
@@ -0,0 +1,93 @@
+from utils.intcode_computer import IntCodeComputer
+from utils.intcode_channel import OutputSink
+
+
+class ProgramIntCodeComputer:
+    """
+    The interface of the original Day 2/5/7 computers, on top of the shared IntCodeComputer: built without a program,
+    and run(program) runs the given program in place and returns it. Errors are raised rather than logged, and with no
+    output queue outputs are printed bare, as the originals did.
+
+    One machine is reused for every run, so its caches carry over (each cached instruction is checked against memory
+    before it's used, so running a different program is safe).
+    """
+
+    def __init__(self, input_queue=None, output_queue=None, computer_class=IntCodeComputer):
+        self.input_queue = input_queue
+        self.output_queue = output_queue if output_queue is not None else OutputSink(print)
+        self.computer_class = computer_class
+        self.computer = None
+
+    restore_state = staticmethod(IntCodeComputer.restore_state)
+
+    def run(self, program):
+        if self.computer is None:
+            self.computer = self.computer_class(program, self.input_queue, self.output_queue)
+        else:
+            self.computer.program = program
+        self.computer.boot()
+        self.computer.execute()
+        memory = self.computer.program_memory
+        if len(memory) > len(program):
+            # The original computers ran the program in place, so they couldn't write past its end either
+            raise IndexError("Write past the end of the program at {}".format(len(memory) - 1))
+        program[:] = memory[:]
+        return program
+
+
+class PreallocatedIntCodeComputer(IntCodeComputer):
+    """
+    The interface of the original Day 9 computer: run() takes a memory_allocation_size and raises errors rather than
+    logging them. Memory grows as needed, so the size is ignored.
+    """
+
+    def run(self, noun=None, verb=None, memory_allocation_size=None):
+        self.boot(noun, verb)
+        self.execute()
+        return self.program_memory
+
+
+def tests():
+    import io
+    import contextlib
+
+    computer = ProgramIntCodeComputer()
+    program = [1, 9, 10, 3, 2, 3, 11, 0, 99, 30, 40, 50]
+    assert computer.run(program) is program
+    assert program[0] == 3500
+    assert computer.run([1, 1, 1, 4, 99, 5, 6, 0, 99, 0, 0, 0]) == [30, 1, 1, 4, 2, 5, 6, 0, 99, 0, 0, 0]
+    assert computer.run(computer.restore_state([1, 1, 1, 4, 99, 5, 6, 0, 99], 0, 1))[0] == 11
+
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        ProgramIntCodeComputer().run([104, 7, 4, 0, 99])
+    assert printed.getvalue() == "7\n104\n"
+
+    outputs = []
+    computer = ProgramIntCodeComputer([8], outputs)
+    computer.run([3, 9, 8, 9, 10, 9, 4, 9, 99, -1, 8])
+    assert outputs == [1]
+
+    try:
+        ProgramIntCodeComputer().run([98])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected an invalid opcode error")
+
+    try:
+        ProgramIntCodeComputer().run([1101, 1, 2, 10 ** 9, 99])
+    except IndexError:
+        pass
+    else:
+        raise AssertionError("Expected a write past the end of the program to fail")
+
+    outputs = []
+    PreallocatedIntCodeComputer([104, 1125899906842624, 99], [], outputs).run(memory_allocation_size=10)
+    assert outputs == [1125899906842624]
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
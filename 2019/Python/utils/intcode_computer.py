@@ -1,23 +1,128 @@
 import os
 import copy
 import queue
+import operator
+import functools
 
-
-def get_program(filepath):
-    # Load the comma separated intcode program from a file into memory (a list).
-    with open(filepath) as f:
-        incode = [int(v) for v in f.readline().split(",")]
-    return incode
+from utils.intcode_loader import get_program
+from utils.intcode_memory import PagedMemory, TypedPagedMemory
+from utils import intcode_channel
+from utils.intcode_channel import CancellationToken, Cancelled, RingChannel, OutputSink
 
 
 READ_PARAM = 0
 WRITE_PARAM = 1
 
+# Yielded by IntCodeComputer.interact when the program is waiting for input
+NEED_INPUT = "NEED_INPUT"
+OUTPUT = "OUTPUT"
+# Yielded by IntCodeComputer.interact when the machine has used up its time slice
+TIME_SLICE_EXPIRED = "TIME_SLICE_EXPIRED"
+
+POSITION_MODE = 0
+IMMEDIATE_MODE = 1
+RELATIVE_MODE = 2
+
+# Operation code -> (Name of the IntCodeComputer method that implements it, Parameter types)
+OPCODES = {
+    1: ("add", (READ_PARAM, READ_PARAM, WRITE_PARAM)),
+    2: ("multiply", (READ_PARAM, READ_PARAM, WRITE_PARAM)),
+    3: ("input", (WRITE_PARAM,)),
+    4: ("output", (READ_PARAM,)),
+    5: ("jump_if_true", (READ_PARAM, READ_PARAM)),
+    6: ("jump_if_false", (READ_PARAM, READ_PARAM)),
+    7: ("less_than", (READ_PARAM, READ_PARAM, WRITE_PARAM)),
+    8: ("equals", (READ_PARAM, READ_PARAM, WRITE_PARAM)),
+    9: ("adjust_relative_offset", (READ_PARAM,)),
+    99: ("halt", ()),
+}
+# Operation codes of the conditional jumps
+JUMP_OPCODES = tuple(code for code, (name, _) in OPCODES.items() if name.startswith("jump_"))
+
+
+# Instructions that can start a superinstruction, and how each computes the value it stores
+FUSED_OPERATIONS = {
+    1: operator.add,
+    2: operator.mul,
+    7: lambda x, y: 1 if x < y else 0,
+    8: lambda x, y: 1 if x == y else 0,
+}
+# Superinstructions end with one of these
+FUSED_JUMPS = JUMP_OPCODES
+# Stands in for the opcode of each later instruction in a superinstruction's parameter modes, so get_inputs resolves
+# it to the opcode's address and every parameter to the same address as it would for the instruction on its own.
+OPCODE_SLOT = (IMMEDIATE_MODE, READ_PARAM)
+
+
+def decode_opcode(opcode):
+    """
+    Split an opcode (e.g. 1002) into its operation code and the (mode, parameter type) of each parameter.
+    :param int -> opcode:
+    :return Tuple[int, List[Tuple[int, int]]]:
+    """
+    code = opcode % 100
+    if opcode < 0 or code not in OPCODES:
+        raise ValueError("Invalid Opcode: {}".format(opcode))
+    modes = opcode // 100
+    input_modes = []
+    for arg in OPCODES[code][1]:
+        mode = modes % 10
+        modes //= 10
+        if mode not in (POSITION_MODE, IMMEDIATE_MODE, RELATIVE_MODE):
+            raise ValueError("Invalid Mode: {}".format(mode))
+        if mode == IMMEDIATE_MODE and arg != READ_PARAM:
+            raise ValueError("Invalid parameter type {} for mode {}".format(arg, mode))
+        input_modes.append((mode, arg))
+    return code, input_modes
+
+
+class Snapshot:
+    """
+    Frozen state of an IntCodeComputer. Memory is shared copy-on-write with the machine it was taken from and with
+    every machine restored or forked from it, so taking one only copies the page table and any pending I/O.
+    """
+
+    def __init__(self, memory, instruction_pointer, relative_base, running, pending_input, pending_output):
+        self.memory = memory
+        self.instruction_pointer = instruction_pointer
+        self.relative_base = relative_base
+        self.running = running
+        self.pending_input = pending_input
+        self.pending_output = pending_output
+
+
+def get_pending(channel):
+    # The values waiting in an input/output list or queue
+    if channel is None:
+        return []
+    elif channel.__class__ in (RingChannel, OutputSink):
+        return channel.queue
+    elif hasattr(channel, 'queue'):
+        with channel.mutex:
+            return list(channel.queue)
+    return list(channel)
+
+
+def copy_channel(channel, values):
+    # A new channel of the same kind as channel, holding values
+    if channel is None:
+        return None
+    elif channel.__class__ is OutputSink:
+        new_channel = OutputSink(channel.callback, channel.arity, channel.batched)
+        for value in values:
+            new_channel.put(value)
+        return new_channel
+    elif hasattr(channel, 'queue'):
+        new_channel = type(channel)(channel.maxsize)
+        for value in values:
+            new_channel.put_nowait(value)
+        return new_channel
+    return list(values)
+
 
 class IntCodeComputer:
-    READ_TIMEOUT = 1
-    WRITE_TIMEOUT = 1
-    MAX_TIMEOUTS = 10
+    # Memory backend. TypedPagedMemory is more compact for large memory images.
+    memory_class = PagedMemory
 
     def __init__(self, program, input_queue=None, output_queue=None, name="IntCodeComputer", debug=False, log=None):
         self.program = copy.copy(program)
@@ -31,6 +136,21 @@ class IntCodeComputer:
         self.name = name
         self.debug = debug
         self.log_file = log
+        # Set while running under interact(). I/O instructions then suspend the machine and record an io_event
+        # instead of using the queues.
+        self.suspend_on_io = False
+        self.io_event = None
+        # Blocking reads and writes on queue.Queue and RingChannel channels give up when this is cancelled (see
+        # cancel). Replace it to stop several machines with one token.
+        self.cancellation = CancellationToken()
+        # The token this machine made for itself. Only that one is renewed between runs (see renew_cancellation).
+        self.own_cancellation = self.cancellation
+        # Pristine copy of program for reset(), and the program it was made from
+        self.image = None
+        self.image_source = None
+        self.instruction_cache = None
+        self.dispatch_cache = None
+        self.clear_caches()
 
     @staticmethod
     def restore_state(program, noun=None, verb=None):
@@ -40,14 +160,8 @@ class IntCodeComputer:
             program[2] = verb
         return program
 
-    @staticmethod
-    def initialize_program_memory(program, memory_allocation_size=None):
-        # Would be nice to instead allow memory to dynamically grow as the program needs
-        memory_allocation_size = memory_allocation_size or len(program)
-        program_memory = [0] * memory_allocation_size
-        for i, v in enumerate(program):
-            program_memory[i] = v
-        return program_memory
+    def initialize_program_memory(self, program):
+        return self.memory_class(program)
 
     def log(self, message):
         if self.log_file:
@@ -56,31 +170,296 @@ class IntCodeComputer:
         else:
             print(message)
 
-    def run(self, noun=None, verb=None, memory_allocation_size=None):
+    def boot(self, noun=None, verb=None):
+        self.program_memory = self.restore_state(self.initialize_program_memory(self.program), noun, verb)
+        self.relative_base = 0
+        self.instruction_pointer = 0
+        self.next_instruction_pointer = None
+        self.running = True
+        self.renew_cancellation()
+        if self.debug:
+            self.log("Program Start For {}".format(self.name))
+
+    def reset(self, patches=None):
+        """
+        boot() for repeated runs: memory is restored into the buffers of the last run from a pristine image of the
+        program (a slice copy per page) instead of being allocated afresh, then patches (address -> value, e.g.
+        {1: noun, 2: verb}) are applied. Follow with execute(), resume() or interact(resume=True).
+        """
+        if self.image_source is not self.program:
+            self.image = self.initialize_program_memory(self.program)
+            self.image_source = self.program
+        if isinstance(self.program_memory, PagedMemory):
+            self.program_memory.reset(self.image)
+        else:
+            self.program_memory = self.initialize_program_memory(self.program)
+        for address, value in (patches or {}).items():
+            self.program_memory[address] = value
+        self.relative_base = 0
+        self.instruction_pointer = 0
+        self.next_instruction_pointer = None
+        self.running = True
+        self.renew_cancellation()
+        if self.debug:
+            self.log("Program Start For {}".format(self.name))
+
+    def run(self, noun=None, verb=None):
         try:
-            self.program_memory = self.restore_state(
-                self.initialize_program_memory(self.program, memory_allocation_size), noun, verb
-            )
-            self.relative_base = 0
-            self.instruction_pointer = 0
-            self.next_instruction_pointer = None
-            self.running = True
-            if self.debug:
-                self.log("Program Start For {}".format(self.name))
-            while self.running:
-                opcode = self.program_memory[self.instruction_pointer]
-                method, input_modes = self.get_method(opcode)
-                inputs = self.get_inputs(input_modes)
-                if self.debug:
-                    self.log("{}: Instruction:{}({}) Inputs:{}({})".format(
-                        self.name, opcode, method.__name__, inputs, input_modes
-                    ))
-                self.perform_operation(method, inputs)
-                self.increment_program_counter(inputs)
+            self.boot(noun, verb)
+            self.execute()
             return self.program_memory
+        except Cancelled:
+            self.running = False
         except Exception as e:
             self.log(str(e))
 
+    def resume(self):
+        # Continue from the current state (e.g. after restore or fork) instead of booting the program afresh.
+        try:
+            self.execute()
+            return self.program_memory
+        except Cancelled:
+            self.running = False
+        except Exception as e:
+            self.log(str(e))
+
+    def renew_cancellation(self):
+        # A cancel stops a run, not the machine, so the next run gets a fresh token if the machine's own was cancelled.
+        # A token set from outside belongs to whoever set it (and may have been cancelled before this run started), so
+        # it's left for them to reset.
+        if self.cancellation is self.own_cancellation and self.cancellation.cancelled:
+            self.cancellation = self.own_cancellation = CancellationToken()
+
+    def cancel(self):
+        # Stop the machine from another thread: it stops after the current instruction, or if it's blocked reading or
+        # writing a channel, straight away on a RingChannel and within POLL_INTERVAL on a queue.Queue. run() then
+        # returns None.
+        self.running = False
+        self.cancellation.cancel()
+
+    def interact(self, noun=None, verb=None, resume=False, time_slice=None):
+        """
+        Run the program as a generator instead of through the input/output queues, so it can be driven from the
+        caller's thread with no locking. Yields each output value, and NEED_INPUT when the program wants input;
+        answer that with generator.send(value). Resume after an output with next(generator).
+        Given a time_slice, TIME_SLICE_EXPIRED is also yielded every (roughly) time_slice instructions so a scheduler
+        can switch machines; resume with next(generator).
+        Returns (i.e. raises StopIteration with) the final memory when the program halts.
+        Unlike run(), errors aren't swallowed.
+        """
+        if not resume:
+            self.boot(noun, verb)
+        self.suspend_on_io = True
+        try:
+            while True:
+                self.io_event = None
+                self.execute(time_slice)
+                if self.io_event is None:
+                    if self.running:
+                        yield TIME_SLICE_EXPIRED
+                        continue
+                    return self.program_memory
+                self.running = True
+                event, value = self.io_event
+                if event == NEED_INPUT:
+                    sent = yield NEED_INPUT
+                    while sent is None:
+                        sent = yield NEED_INPUT
+                    if self.debug:
+                        self.log("{}: Received {}".format(self.name, sent))
+                    self.program_memory[value] = sent
+                else:
+                    yield value
+        finally:
+            self.suspend_on_io = False
+
+    def suspend(self, event, value):
+        # Stop execute() and hand the I/O over to interact()
+        self.io_event = (event, value)
+        self.running = False
+
+    def snapshot(self):
+        return Snapshot(
+            self.program_memory.fork(), self.instruction_pointer, self.relative_base, self.running,
+            get_pending(self.input_queue), get_pending(self.output_queue)
+        )
+
+    def restore(self, snapshot):
+        # Note this doesn't touch the I/O channels, see fork
+        self.program_memory = snapshot.memory.fork()
+        self.instruction_pointer = snapshot.instruction_pointer
+        self.relative_base = snapshot.relative_base
+        self.running = snapshot.running
+        self.next_instruction_pointer = None
+
+    def fork(self, snapshot=None, input_queue=None, output_queue=None, name=None):
+        """
+        Create a new machine in the state captured by snapshot (or this machine's current state).
+        Without explicit queues the child gets copies of the snapshot's pending input and output.
+        :param Snapshot -> snapshot:
+        :return IntCodeComputer:
+        """
+        snapshot = snapshot or self.snapshot()
+        child = copy.copy(self)
+        child.cancellation = child.own_cancellation = CancellationToken()
+        child.clear_caches()
+        child.restore(snapshot)
+        child.input_queue = input_queue if input_queue is not None else copy_channel(
+            self.input_queue, snapshot.pending_input
+        )
+        child.output_queue = output_queue if output_queue is not None else copy_channel(
+            self.output_queue, snapshot.pending_output
+        )
+        child.name = name or self.name
+        return child
+
+    def clear_caches(self):
+        # Caches hold methods bound to this machine, so they can't be shared with a fork.
+        # Address -> (opcode, method, input modes, instruction length). Entries are checked against the opcode
+        # currently in memory on every fetch, so programs that rewrite their own instructions are re-decoded.
+        self.instruction_cache = {}
+        # What execute() dispatches on. Address -> the instruction_cache entry, or a superinstruction (see fuse) as
+        # (opcode, method, input modes, total length, instruction count).
+        self.dispatch_cache = {}
+
+    def execute(self, budget=None):
+        # Run until the program halts, or until budget instructions have run. Returns the number of instructions run.
+        # A superinstruction runs as a whole, so this can overshoot budget by up to two instructions.
+        # This is the hot loop, so the decode cache lookup is inlined.
+        dispatch_cache = self.dispatch_cache
+        limit = float("inf") if budget is None else budget
+        steps = 0
+        while self.running:
+            opcode = self.program_memory[self.instruction_pointer]
+            instruction = dispatch_cache.get(self.instruction_pointer)
+            if instruction is None or instruction[0] != opcode:
+                instruction = self.decode_fused(self.instruction_pointer)
+            _, method, input_modes, length, count = instruction
+            inputs = self.get_inputs(input_modes)
+            if self.debug:
+                self.log("{}: Instruction:{}({}) Inputs:{}({})".format(
+                    self.name, opcode, method.__name__, inputs, input_modes
+                ))
+            method(*inputs)
+            if self.next_instruction_pointer is None:
+                self.instruction_pointer += length
+            else:
+                self.instruction_pointer = self.next_instruction_pointer
+                self.next_instruction_pointer = None
+            steps += count
+            if steps >= limit:
+                break
+        return steps
+
+    def step(self):
+        # Execute the single instruction at the instruction pointer.
+        opcode = self.program_memory[self.instruction_pointer]
+        _, method, input_modes, _ = self.decode(self.instruction_pointer)
+        inputs = self.get_inputs(input_modes)
+        if self.debug:
+            self.log("{}: Instruction:{}({}) Inputs:{}({})".format(
+                self.name, opcode, method.__name__, inputs, input_modes
+            ))
+        self.perform_operation(method, inputs)
+        self.increment_program_counter(inputs)
+        return inputs
+
+    def decode(self, address):
+        opcode = self.program_memory[address]
+        instruction = self.instruction_cache.get(address)
+        if instruction is None or instruction[0] != opcode:
+            method, input_modes = self.get_method(opcode)
+            instruction = (opcode, method, input_modes, 1 + len(input_modes))
+            self.instruction_cache[address] = instruction
+        return instruction
+
+    def decode_fused(self, address):
+        instruction = self.decode(address)
+        fused = None if self.debug else self.fuse(address, instruction)
+        if fused is None:
+            fused = instruction + (1,)
+        self.dispatch_cache[address] = fused
+        return fused
+
+    def fuse(self, address, instruction):
+        """
+        Superinstructions run a common sequence as one dispatch: an add, multiply or compare followed by a jump
+        (e.g. a loop counter update and its test), or an add or multiply, then a compare, then a jump.
+        Only the first instruction's opcode is checked on fetch, so the handlers check the later opcodes themselves,
+        and stop early if a write lands on an instruction they have still to run. A handler that stops early returns
+        how many of its instructions it ran (execute doesn't need it, the profiler does).
+        :return Optional[Tuple]: The dispatch_cache entry, or None if the instruction at address doesn't start one
+        """
+        opcode, _, input_modes, length = instruction
+        code = opcode % 100
+        if code not in FUSED_OPERATIONS:
+            return None
+        memory = self.program_memory
+        second_address = address + length
+        try:
+            second_code, second_modes = decode_opcode(memory[second_address])
+        except (ValueError, IndexError):
+            return None
+        if second_code in FUSED_JUMPS:
+            method = functools.partial(
+                self.operate_and_jump, FUSED_OPERATIONS[code], memory[second_address], second_code == 5
+            )
+            return (
+                opcode, method, input_modes + [OPCODE_SLOT] + second_modes, length + 1 + len(second_modes), 2
+            )
+        if code not in (1, 2) or second_code not in (7, 8):
+            return None
+        third_address = second_address + 1 + len(second_modes)
+        try:
+            third_code, third_modes = decode_opcode(memory[third_address])
+        except (ValueError, IndexError):
+            return None
+        if third_code not in FUSED_JUMPS:
+            return None
+        method = functools.partial(
+            self.operate_compare_and_jump, FUSED_OPERATIONS[code], FUSED_OPERATIONS[second_code],
+            memory[second_address], memory[third_address], third_code == 5
+        )
+        input_modes = input_modes + [OPCODE_SLOT] + second_modes + [OPCODE_SLOT] + third_modes
+        return opcode, method, input_modes, third_address + 1 + len(third_modes) - address, 3
+
+    def unfuse(self):
+        # The code has changed under a superinstruction. Run nothing and come back to re-decode it.
+        self.dispatch_cache.pop(self.instruction_pointer, None)
+        self.next_instruction_pointer = self.instruction_pointer
+        return 0
+
+    def operate_and_jump(self, operation, jump_opcode, jump_if_true, x, y, store, jump_address, test, jump):
+        memory = self.program_memory
+        if memory[jump_address] != jump_opcode:
+            return self.unfuse()
+        value = operation(memory[x], memory[y])
+        memory[store] = value
+        if jump_address <= store < jump_address + 3:
+            # Rewrote the jump, so decode it afresh
+            self.next_instruction_pointer = jump_address
+            return 1
+        elif bool(value if test == store else memory[test]) == jump_if_true:
+            self.next_instruction_pointer = memory[jump]
+
+    def operate_compare_and_jump(self, operation, comparison, compare_opcode, jump_opcode, jump_if_true,
+                                 x, y, store, compare_address, compare_x, compare_y, compare_store, jump_address,
+                                 test, jump):
+        memory = self.program_memory
+        if memory[compare_address] != compare_opcode or memory[jump_address] != jump_opcode:
+            return self.unfuse()
+        memory[store] = operation(memory[x], memory[y])
+        if compare_address <= store < jump_address + 3:
+            self.next_instruction_pointer = compare_address
+            return 1
+        value = comparison(memory[compare_x], memory[compare_y])
+        memory[compare_store] = value
+        if jump_address <= compare_store < jump_address + 3:
+            self.next_instruction_pointer = jump_address
+            return 2
+        elif bool(value if test == compare_store else memory[test]) == jump_if_true:
+            self.next_instruction_pointer = memory[jump]
+
     def add(self, x, y, store):
         self.program_memory[store] = self.program_memory[x] + self.program_memory[y]
 
@@ -88,18 +467,16 @@ class IntCodeComputer:
         self.program_memory[store] = self.program_memory[x] * self.program_memory[y]
 
     def input(self, store):
-        if self.input_queue is None:
+        if self.suspend_on_io:
+            self.suspend(NEED_INPUT, store)
+            return
+        self.flush_output()
+        if self.input_queue.__class__ is RingChannel:
+            value = self.input_queue.get(self.cancellation)
+        elif self.input_queue is None:
             value = int(input("Input:"))
         elif hasattr(self.input_queue, 'get'):
-            value = self.input_queue.get()
-            # timeouts = 0
-            # while self.running and timeouts < self.MAX_TIMEOUTS:
-            #     try:
-            #         value = self.input_queue.get(timeout=self.READ_TIMEOUT)
-            #     except queue.Empty:
-            #         timeouts += 1
-            #         if self.debug:
-            #             print("Input Timeout {} ({})".format(timeouts, self.input_queue.qsize()))
+            value = intcode_channel.get(self.input_queue, self.cancellation)
         elif hasattr(self.input_queue, 'pop'):
             value = self.input_queue.pop(0)
         else:
@@ -114,18 +491,16 @@ class IntCodeComputer:
         if self.debug:
             self.log("{}: Storing {}".format(self.name, value))
 
-        if self.output_queue is None:
+        if self.suspend_on_io:
+            self.suspend(OUTPUT, value)
+        elif self.output_queue.__class__ is RingChannel:
+            self.output_queue.put(value, self.cancellation)
+        elif self.output_queue.__class__ is OutputSink:
+            self.output_queue.put(value)
+        elif self.output_queue is None:
             print("Output:{}".format(value))
         elif hasattr(self.output_queue, 'put'):
-            self.output_queue.put(value)
-            # timeouts = 0
-            # while self.running and timeouts < self.MAX_TIMEOUTS:
-            #     try:
-            #         self.output_queue.put(value, timeout=self.WRITE_TIMEOUT)
-            #     except queue.Full:
-            #         timeouts += 1
-            #         if self.debug:
-            #             print("Output Timeout {} ({})".format(timeouts, self.output_queue.qsize()))
+            intcode_channel.put(self.output_queue, value, self.cancellation)
         elif hasattr(self.output_queue, 'append'):
             self.output_queue.append(value)
         else:
@@ -155,62 +530,32 @@ class IntCodeComputer:
         value = self.program_memory[address]
         self.relative_base += value
 
+    def flush_output(self):
+        # Hand a batched OutputSink everything output since the machine last wanted input
+        if self.output_queue.__class__ is OutputSink:
+            self.output_queue.flush()
+
     def halt(self):
         self.running = False
+        self.flush_output()
 
     def get_method(self, opcode):
-        ops = {
-            1: (self.add, [READ_PARAM, READ_PARAM, WRITE_PARAM]),
-            2: (self.multiply, [READ_PARAM, READ_PARAM, WRITE_PARAM]),
-            3: (self.input, [WRITE_PARAM]),
-            4: (self.output, [READ_PARAM]),
-            5: (self.jump_if_true, [READ_PARAM, READ_PARAM]),
-            6: (self.jump_if_false, [READ_PARAM, READ_PARAM]),
-            7: (self.less_than, [READ_PARAM, READ_PARAM, WRITE_PARAM]),
-            8: (self.equals, [READ_PARAM, READ_PARAM, WRITE_PARAM]),
-            9: (self.adjust_relative_offset, [READ_PARAM]),
-            99: (self.halt, []),
-        }
-        # Work with strings for this parsing because it's easier.
-        opstring = str(opcode)
-        code = int(opstring[-2:])
-        method, args = ops[code]
-        opstring = opstring[-3::-1]
-        input_modes = []
-        for i, arg in enumerate(args):
-            if i + 1 > len(opstring):
-                # Default if not given
-                input_modes.append((0, arg))
-            else:
-                input_modes.append((int(opstring[i]), arg))
-        return method, input_modes
+        code, input_modes = decode_opcode(opcode)
+        return getattr(self, OPCODES[code][0]), input_modes
 
     def get_inputs(self, input_modes):
-        codes = []
+        # Resolve each parameter to the address it refers to. Modes were validated when the opcode was decoded.
+        program_memory = self.program_memory
         inputs = []
-        for i, arg in enumerate(input_modes, start=self.instruction_pointer + 1):
-            mode, arg_type = arg
-            codes.append(self.program_memory[i])
-            if mode == 0:
-                # Position Mode (i.e. Reference)
-                if arg_type in (READ_PARAM, WRITE_PARAM):
-                    inputs.append(self.program_memory[i])
-                else:
-                    raise ValueError("Invalid parameter type {} for mode {}".format(arg_type, mode))
-            elif mode == 1:
-                # Intermediate Mode (i.e. Value)
-                if arg_type == READ_PARAM:
-                    inputs.append(i)
-                else:
-                    raise ValueError("Invalid parameter type {} for mode {}".format(arg_type, mode))
-            elif mode == 2:
-                # Relative Mode
-                if arg_type in (READ_PARAM, WRITE_PARAM):
-                    inputs.append(self.relative_base + self.program_memory[i])
-                else:
-                    raise ValueError("Invalid parameter type {} for mode {}".format(arg_type, mode))
+        address = self.instruction_pointer
+        for mode, _ in input_modes:
+            address += 1
+            if mode == POSITION_MODE:
+                inputs.append(program_memory[address])
+            elif mode == IMMEDIATE_MODE:
+                inputs.append(address)
             else:
-                raise ValueError("Invalid Mode: {}".format(mode))
+                inputs.append(self.relative_base + program_memory[address])
         return inputs
 
     def perform_operation(self, method, inputs):
@@ -223,6 +568,11 @@ class IntCodeComputer:
         self.next_instruction_pointer = None
 
 
+class TypedIntCodeComputer(IntCodeComputer):
+    # Memory on array('q') pages, see TypedPagedMemory
+    memory_class = TypedPagedMemory
+
+
 def tests():
 
     assert IntCodeComputer([1,9,10,3,2,3,11,0,99,30,40,50]).run()[0] == 3500
@@ -299,20 +649,134 @@ def tests():
     104,1125899906842624,99 should output the large number in the middle.
     """
     test_cases = [
-        ([109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99], [], [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99], 1000),
-        ([1102,34915192,34915192,7,4,7,99,0], [], [1219070632396864], None),
-        ([104,1125899906842624,99], [], [1125899906842624], None),
+        ([109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99], [], [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99]),
+        ([1102,34915192,34915192,7,4,7,99,0], [], [1219070632396864]),
+        ([104,1125899906842624,99], [], [1125899906842624]),
+        # Reads and writes far past the end of the program
+        ([1101,5,6,1000000000,4,1000000000,4,2000000000,99], [], [11, 0]),
     ]
-    for program, inputs, expected_outputs, required_memory in test_cases:
+    for program, inputs, expected_outputs in test_cases:
         outputs = []
         computer = IntCodeComputer(program, inputs, outputs)
         try:
-            computer.run(memory_allocation_size=required_memory)
+            computer.run()
             assert outputs == expected_outputs
         except (AssertionError, IndexError):
             print(program, outputs, expected_outputs)
             raise
 
+    # Self modifying program. The add at address 0 is rewritten into a multiply and then re-executed.
+    program = [1101, 3, 4, 24, 4, 24, 1005, 25, 23, 1101, 0, 1102, 0, 1101, 0, 1, 25, 1105, 1, 0, 99, 99, 99, 99, 0, 0]
+    outputs = []
+    IntCodeComputer(program, [], outputs).run()
+    assert outputs == [7, 12]
+
+    # Fork from a warm snapshot. Children share memory with the snapshot until they write to it.
+    program = [3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+               1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+               999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99]
+    computer = IntCodeComputer(program, [], [])
+    computer.boot()
+    snapshot = computer.snapshot()
+    for value, expected in ((7, 999), (8, 1000), (9, 1001)):
+        child = computer.fork(snapshot, input_queue=[value])
+        child.resume()
+        assert child.output_queue == [expected]
+    assert snapshot.memory == program
+    computer.input_queue.append(8)
+    computer.resume()
+    assert computer.output_queue == [1000]
+
+    queue_computer = IntCodeComputer(program, queue.Queue(), queue.Queue())
+    queue_computer.input_queue.put(8)
+    queue_computer.boot()
+    child = queue_computer.fork()
+    child.resume()
+    assert child.output_queue.get_nowait() == 1000
+    assert queue_computer.input_queue.qsize() == 1
+
+    # Driven as a generator
+    machine = IntCodeComputer(program).interact()
+    assert next(machine) == NEED_INPUT
+    assert machine.send(9) == 1001
+    try:
+        next(machine)
+    except StopIteration as halted:
+        assert halted.value[20] == 1001
+    else:
+        raise AssertionError("Program should have halted")
+
+    quine = [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99]
+    assert list(IntCodeComputer(quine).interact()) == quine
+    events = list(IntCodeComputer(quine).interact(time_slice=3))
+    assert TIME_SLICE_EXPIRED in events
+    assert [event for event in events if event != TIME_SLICE_EXPIRED] == quine
+
+    computer = IntCodeComputer(quine, [], [])
+    computer.boot()
+    assert computer.execute(budget=5) == 5
+    assert computer.output_queue == [109]
+
+    # Superinstructions: add/compare/jump in the quine, add/jump in a countdown loop
+    assert computer.dispatch_cache[4][4] == 3
+    countdown = [1101, 0, 100, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    computer = IntCodeComputer(countdown, [], [])
+    computer.boot()
+    assert computer.execute() == 203
+    assert computer.output_queue == [0]
+    assert computer.dispatch_cache[4][4] == 2
+
+    # A superinstruction that rewrites its own jump, and one whose jump is rewritten by other code
+    for program, expected in (
+        ([1101, 0, 1106, 4, 1105, 1, 10, 104, 1, 99, 104, 2, 99], [1]),
+        ([1001, 20, 1, 20, 1006, 21, 12, 4, 20, 99, 0, 0, 1101, 1106, 0, 4, 1105, 1, 0, 0, 0, 0], [2]),
+    ):
+        computer = IntCodeComputer(program, [], [])
+        computer.run()
+        assert computer.output_queue == expected
+
+    # Typed memory gives the same results, including past 64 bits
+    for program, expected in (
+        ([1102, 34915192, 34915192, 7, 4, 7, 99, 0], [1219070632396864]),
+        ([1102, 34915192, 34915192, 11, 1002, 11, 34915192, 11, 4, 11, 99, 0], [34915192 ** 3]),
+        (quine, quine),
+    ):
+        computer = TypedIntCodeComputer(program, [], [])
+        computer.run()
+        assert computer.output_queue == expected
+        computer.output_queue = []
+        computer.reset()
+        computer.execute()
+        assert computer.output_queue == expected
+
+    # Cancelling a machine blocked on input stops it promptly
+    import threading
+    computer = IntCodeComputer([3, 0, 99], queue.Queue(), queue.Queue())
+    results = []
+    thread = threading.Thread(target=lambda: results.append(computer.run()))
+    thread.start()
+    thread.join(0.05)
+    assert thread.is_alive()
+    computer.cancel()
+    thread.join(1)
+    assert not thread.is_alive() and results == [None] and not computer.running
+
+    # A cancelled machine can be run again, and block on its channels as before
+    threading.Timer(0.05, computer.input_queue.put, (7,)).start()
+    assert computer.run() == [7, 0, 99]
+    computer.cancel()
+    threading.Timer(0.05, computer.input_queue.put, (8,)).start()
+    computer.reset()
+    computer.execute()
+    assert computer.program_memory == [8, 0, 99]
+
+    # A token shared from outside is never un-cancelled by the machine, so a cancel before the run still stops it
+    token = CancellationToken()
+    token.cancel()
+    computer = IntCodeComputer([3, 0, 99], queue.Queue(), [])
+    computer.cancellation = token
+    assert computer.run() is None and token.cancelled
+
     print("Tests Done")
 
 
@@ -323,4 +787,4 @@ if __name__ == "__main__":
     program = get_program(input_file)
 
     computer = IntCodeComputer(program)
-    computer.run(memory_allocation_size=10000)
+    computer.run()
@@ -0,0 +1,368 @@
+import os
+import sys
+
+from utils.intcode_computer import (
+    get_program, decode_opcode, OPCODES, JUMP_OPCODES, POSITION_MODE, IMMEDIATE_MODE, WRITE_PARAM
+)
+
+
+HALT_OPCODE = 99
+
+
+class Instruction:
+
+    def __init__(self, address, opcode, input_modes, parameters):
+        self.address = address
+        self.opcode = opcode
+        self.code = opcode % 100
+        self.name = OPCODES[self.code][0]
+        self.input_modes = input_modes
+        self.parameters = parameters
+        self.length = 1 + len(parameters)
+
+    @property
+    def next_address(self):
+        return self.address + self.length
+
+    @property
+    def is_jump(self):
+        return self.code in JUMP_OPCODES
+
+    @property
+    def ends_block(self):
+        return self.is_jump or self.code == HALT_OPCODE
+
+    @property
+    def jump_target(self):
+        # The address a jump goes to if it is known statically, i.e. given as an immediate value
+        if self.is_jump and self.input_modes[1][0] == IMMEDIATE_MODE:
+            return self.parameters[1]
+        return None
+
+    @property
+    def falls_through(self):
+        # Whether execution can carry on to the next instruction
+        if self.code == HALT_OPCODE:
+            return False
+        if self.is_jump and self.input_modes[0][0] == IMMEDIATE_MODE:
+            # Unconditional jumps, e.g. 1105,1,x and 1106,0,x
+            return bool(self.parameters[0]) != (self.code == 5)
+        return True
+
+    @property
+    def jumps(self):
+        # Whether the jump can be taken
+        if not self.is_jump:
+            return False
+        if self.input_modes[0][0] == IMMEDIATE_MODE:
+            return bool(self.parameters[0]) == (self.code == 5)
+        return True
+
+    @property
+    def write_address(self):
+        # The address written to, if it is known statically (i.e. position mode)
+        if self.input_modes and self.input_modes[-1][1] == WRITE_PARAM and self.input_modes[-1][0] == POSITION_MODE:
+            return self.parameters[-1]
+        return None
+
+    @property
+    def writes_dynamically(self):
+        return bool(self.input_modes) and self.input_modes[-1][1] == WRITE_PARAM and self.write_address is None
+
+    def __repr__(self):
+        return "Instruction({}, {})".format(self.address, self.opcode)
+
+    def __str__(self):
+        parameters = []
+        for (mode, _), value in zip(self.input_modes, self.parameters):
+            if mode == POSITION_MODE:
+                parameters.append("[{}]".format(value))
+            elif mode == IMMEDIATE_MODE:
+                parameters.append(str(value))
+            else:
+                parameters.append("[rb{:+d}]".format(value))
+        return "{:>6}: {:<24} {}".format(self.address, self.name, ", ".join(parameters))
+
+
+def decode_instruction(program, address):
+    """
+    Decode the instruction at address, or return None if it isn't a valid instruction.
+    :return Instruction:
+    """
+    if not 0 <= address < len(program):
+        return None
+    try:
+        code, input_modes = decode_opcode(program[address])
+    except ValueError:
+        return None
+    parameters = list(program[address + 1:address + 1 + len(input_modes)])
+    if len(parameters) < len(input_modes):
+        return None
+    return Instruction(address, program[address], input_modes, parameters)
+
+
+def disassemble(program, start=0, end=None):
+    """
+    Linear sweep from start to end. Words that don't decode are given as plain data values.
+    :return List[Union[Instruction, int]]:
+    """
+    end = len(program) if end is None else end
+    listing = []
+    address = start
+    while address < end:
+        instruction = decode_instruction(program, address)
+        if instruction is None:
+            listing.append(program[address])
+            address += 1
+        else:
+            listing.append(instruction)
+            address = instruction.next_address
+    return listing
+
+
+class BasicBlock:
+
+    def __init__(self, start, instructions):
+        self.start = start
+        self.instructions = instructions
+        self.end = instructions[-1].next_address
+        # Start addresses of the blocks execution can continue to. None for a jump to a computed address.
+        self.successors = []
+
+    def __repr__(self):
+        return "BasicBlock({}, {})".format(self.start, self.end)
+
+
+class ProgramAnalysis:
+    """
+    Static analysis of an IntCode program. Instructions are found by following execution from the entry points, so
+    anything never reached is likely data. Jumps to computed (non immediate) addresses can't be followed, which is
+    recorded in indirect_jumps; if there are any, "unreached" only means not reached statically.
+    """
+
+    def __init__(self, program, entry_points=(0,)):
+        self.program = list(program)
+        # Address -> Instruction, for every reachable instruction
+        self.instructions = {}
+        # Statically known jump targets, and the addresses of jumps whose target is computed
+        self.jump_targets = set()
+        self.indirect_jumps = set()
+        # Addresses execution can reach but that don't hold a valid instruction
+        self.invalid_addresses = set()
+        # Start address -> BasicBlock
+        self.blocks = {}
+        # Addresses written by position mode instructions, and the instructions writing via relative mode
+        self.static_writes = set()
+        self.dynamic_writes = set()
+
+        self.trace(entry_points)
+        self.build_blocks(entry_points)
+        for instruction in self.instructions.values():
+            if instruction.write_address is not None:
+                self.static_writes.add(instruction.write_address)
+            elif instruction.writes_dynamically:
+                self.dynamic_writes.add(instruction.address)
+
+    def trace(self, entry_points):
+        to_visit = list(entry_points)
+        while to_visit:
+            address = to_visit.pop()
+            if address in self.instructions or address in self.invalid_addresses:
+                continue
+            instruction = decode_instruction(self.program, address)
+            if instruction is None:
+                self.invalid_addresses.add(address)
+                continue
+            self.instructions[address] = instruction
+            if instruction.jumps:
+                if instruction.jump_target is None:
+                    self.indirect_jumps.add(address)
+                else:
+                    self.jump_targets.add(instruction.jump_target)
+                    to_visit.append(instruction.jump_target)
+            if instruction.falls_through:
+                to_visit.append(instruction.next_address)
+
+    def build_blocks(self, entry_points):
+        leaders = set(entry_points) | self.jump_targets
+        for instruction in self.instructions.values():
+            if instruction.ends_block:
+                leaders.add(instruction.next_address)
+        for leader in sorted(leaders):
+            if leader not in self.instructions:
+                continue
+            instructions = []
+            address = leader
+            while address in self.instructions:
+                instruction = self.instructions[address]
+                instructions.append(instruction)
+                address = instruction.next_address
+                if instruction.ends_block or address in leaders:
+                    break
+            block = BasicBlock(leader, instructions)
+            last = instructions[-1]
+            if last.jumps:
+                block.successors.append(last.jump_target)
+            if last.falls_through and last.next_address in self.instructions:
+                block.successors.append(last.next_address)
+            self.blocks[leader] = block
+
+    @property
+    def code_addresses(self):
+        # Every address holding part of a reachable instruction
+        addresses = set()
+        for instruction in self.instructions.values():
+            addresses.update(range(instruction.address, instruction.next_address))
+        return addresses
+
+    @property
+    def data_regions(self):
+        # (start, end) ranges of the program that no reachable instruction covers
+        code = self.code_addresses
+        regions = []
+        start = None
+        for address in range(len(self.program)):
+            if address in code:
+                if start is not None:
+                    regions.append((start, address))
+                    start = None
+            elif start is None:
+                start = address
+        if start is not None:
+            regions.append((start, len(self.program)))
+        return regions
+
+    @property
+    def self_modified_addresses(self):
+        # Code addresses that are the target of a position mode write
+        return self.static_writes & self.code_addresses
+
+    @property
+    def may_write_anywhere(self):
+        # Relative mode writes can land anywhere, including in code
+        return bool(self.dynamic_writes)
+
+    def writable_addresses(self):
+        """
+        :return Optional[Set[int]]: Every address the program can write to, or None if that can't be bounded
+            statically (relative mode writes or computed jumps).
+        """
+        if self.dynamic_writes or self.indirect_jumps:
+            return None
+        return set(self.static_writes)
+
+    @property
+    def control_addresses(self):
+        # Every word that decides which instructions run and where they write: opcodes, jump parameters and write
+        # parameters. Memory that matches the program at these addresses runs exactly the code analysed here.
+        addresses = set()
+        for instruction in self.instructions.values():
+            addresses.add(instruction.address)
+            for offset, (_, arg_type) in enumerate(instruction.input_modes, 1):
+                if instruction.is_jump or arg_type == WRITE_PARAM:
+                    addresses.add(instruction.address + offset)
+        return addresses
+
+    def code_safe_writes(self):
+        """
+        :return Optional[Set[int]]: Every address the program can write to, if none of them can be code, otherwise
+            None.
+        """
+        writable = self.writable_addresses()
+        if writable is None or self.self_modified_addresses:
+            return None
+        return writable
+
+    def to_dot(self, name="intcode"):
+        # The control flow graph in Graphviz dot format
+        lines = ["digraph {} {{".format(name), "    node [shape=box, fontname=monospace];"]
+        for start, block in sorted(self.blocks.items()):
+            label = "\\l".join(str(instruction).strip() for instruction in block.instructions) + "\\l"
+            lines.append('    b{} [label="{}"];'.format(start, label))
+            for successor in block.successors:
+                if successor is None:
+                    lines.append('    b{} -> indirect [style=dashed];'.format(start))
+                else:
+                    lines.append("    b{} -> b{};".format(start, successor))
+        if self.indirect_jumps:
+            lines.append('    indirect [label="computed jump", shape=ellipse];')
+        lines.append("}")
+        return "\n".join(lines)
+
+    def report(self):
+        return {
+            "instructions": len(self.instructions),
+            "blocks": len(self.blocks),
+            "jump_targets": sorted(self.jump_targets),
+            "indirect_jumps": sorted(self.indirect_jumps),
+            "data_regions": self.data_regions,
+            "static_writes": sorted(self.static_writes),
+            "dynamic_writes": sorted(self.dynamic_writes),
+            "self_modified_addresses": sorted(self.self_modified_addresses),
+        }
+
+
+def tests():
+    comparison_program = [
+        3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+        1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+        999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+    ]
+    analysis = ProgramAnalysis(comparison_program)
+    assert analysis.jump_targets == {22, 31, 36, 46}
+    assert sorted(analysis.blocks) == [0, 9, 16, 22, 31, 36, 46]
+    assert analysis.blocks[0].successors == [22, 9]
+    # Unconditional jumps have no fall through
+    assert analysis.blocks[16].successors == [36]
+    assert analysis.blocks[46].successors == []
+    # 19-21 are variables, 45 is never reached
+    assert analysis.data_regions == [(19, 22), (45, 46)]
+    assert analysis.static_writes == {20, 21}
+    assert analysis.writable_addresses() == {20, 21}
+    assert not analysis.self_modified_addresses
+    assert analysis.code_safe_writes() == {20, 21}
+    assert {0, 1, 2, 5, 6, 7, 8} <= analysis.control_addresses and 3 not in analysis.control_addresses
+
+    listing = disassemble(comparison_program, 0, 9)
+    assert [str(instruction).split() for instruction in listing] == [
+        ["0:", "input", "[21]"],
+        ["2:", "equals", "[21],", "8,", "[20]"],
+        ["6:", "jump_if_true", "[20],", "22"],
+    ]
+
+    # Relative mode writes and computed jumps make the write set unknowable
+    quine = [109, 1, 204, -1, 1001, 100, 1, 100, 1008, 100, 16, 101, 1006, 101, 0, 99]
+    analysis = ProgramAnalysis(quine)
+    assert analysis.jump_targets == {0}
+    assert analysis.writable_addresses() == {100, 101}
+    analysis = ProgramAnalysis([109, 10, 21101, 1, 2, 0, 6, 10, 11, 99, 99, 7])
+    assert analysis.dynamic_writes == {2}
+    assert analysis.indirect_jumps == {6}
+    assert analysis.writable_addresses() is None
+
+    # Self modifying code
+    program = [1101, 3, 4, 24, 4, 24, 1005, 25, 23, 1101, 0, 1102, 0, 1101, 0, 1, 25, 1105, 1, 0, 99, 99, 99, 99, 0, 0]
+    analysis = ProgramAnalysis(program)
+    assert analysis.self_modified_addresses == {0}
+    assert analysis.code_safe_writes() is None
+    assert [instruction.address for instruction in analysis.blocks[9].instructions] == [9, 13, 17]
+    assert "b9 -> b0;" in analysis.to_dot()
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "Input"
+    )
+    program = get_program(input_file)
+
+    analysis = ProgramAnalysis(program)
+    for item in disassemble(program):
+        if isinstance(item, Instruction) and item.address in analysis.instructions:
+            print(item)
+        else:
+            print("{:>6}  data {}".format("", item))
+    print(analysis.report())
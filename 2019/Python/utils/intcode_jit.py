@@ -0,0 +1,384 @@
+import os
+
+from utils.intcode_computer import (
+    IntCodeComputer, get_program, decode_opcode, JUMP_OPCODES, POSITION_MODE, IMMEDIATE_MODE, WRITE_PARAM, NEED_INPUT
+)
+from utils.intcode_disassembler import ProgramAnalysis
+from utils.intcode_memory import PAGE_SHIFT, PAGE_MASK
+
+
+# Opcodes left to the interpreter. They end a basic block without being part of it.
+INTERPRETED_OPCODES = (3, 4, 99)
+# Opcodes that end a basic block after being compiled into it are the jumps (JUMP_OPCODES).
+# Keep generated functions a reasonable size for straight line programs.
+MAX_BLOCK_LENGTH = 256
+# Blocks whose code keeps changing (e.g. noun/verb operands patched on every run) are left to the interpreter.
+MAX_RECOMPILES = 4
+
+
+class CompiledIntCodeComputer(IntCodeComputer):
+    """
+    IntCode computer that splits the program into basic blocks and compiles each one into a single Python function.
+    A block runs up to and including a jump, and stops before any I/O or halt instruction (those are left to the
+    interpreter so queues and subclass overrides behave exactly as they do for IntCodeComputer).
+
+    Parameter modes are resolved when the block is compiled, so the generated code only does the arithmetic.
+    A write into compiled code parks the blocks that cover the written address (and ends the running block if it hit
+    an instruction that block has still to run). A parked block is put back when it's next reached if its memory has
+    been restored, otherwise it is recompiled from the new contents.
+
+    Stores that ProgramAnalysis proves can't reach code skip the check for compiled code altogether. The proof only
+    holds while memory matches the analysed program at every control address, so it's rechecked whenever memory
+    changes under the blocks.
+    """
+
+    def __init__(self, program, input_queue=None, output_queue=None, name="CompiledIntCodeComputer", debug=False,
+                 log=None):
+        self.blocks = None
+        self.compiled_blocks = None
+        self.block_words = None
+        self.compiled_addresses = None
+        self.recompiles = None
+        self.compiled_memory = None
+        self.analysis = None
+        self.analysis_source = None
+        self.code_safe_writes = None
+        self.control_addresses = None
+        self.safe_stores = None
+        self.unchecked_blocks = None
+        super().__init__(program, input_queue, output_queue, name=name, debug=debug, log=log)
+
+    def clear_caches(self):
+        super().clear_caches()
+        # Start address -> compiled block, for the blocks known to match memory
+        self.blocks = {}
+        # Start address -> compiled block, including parked blocks
+        self.compiled_blocks = {}
+        # Start address -> the memory the block was compiled from
+        self.block_words = {}
+        # Address -> start addresses of every compiled block covering it
+        self.compiled_addresses = {}
+        # Start address -> number of times the block at that address has been thrown away
+        self.recompiles = {}
+        # The memory the blocks were last validated against
+        self.compiled_memory = None
+        # Static analysis of self.program, redone if the program is replaced
+        self.analysis = None
+        self.analysis_source = None
+        self.code_safe_writes = None
+        self.control_addresses = None
+        # Addresses that compiled stores can write without checking for compiled code
+        self.safe_stores = frozenset()
+        # Start addresses of the blocks compiled with unchecked stores
+        self.unchecked_blocks = set()
+
+    def revalidate(self):
+        # Blocks outlive the memory they were compiled from (a new run, restore or fork), so on a memory change keep
+        # only the blocks that still match the new memory.
+        self.update_safe_stores()
+        for start in list(self.block_words):
+            if not self.reinstate(start):
+                self.discard_block(start)
+        self.compiled_memory = self.program_memory
+
+    def update_safe_stores(self):
+        if self.analysis_source is not self.program:
+            self.analysis = ProgramAnalysis(self.program)
+            self.analysis_source = self.program
+            self.code_safe_writes = self.analysis.code_safe_writes()
+            self.control_addresses = sorted(self.analysis.control_addresses)
+        memory = self.program_memory
+        program = self.analysis.program
+        if self.code_safe_writes is not None and all(
+            memory[address] == program[address] for address in self.control_addresses
+        ):
+            self.safe_stores = self.code_safe_writes
+            return
+        # The code may be patched to write anywhere, so blocks that trusted the analysis have to go
+        self.safe_stores = frozenset()
+        for start in list(self.unchecked_blocks):
+            self.remove_block(start)
+
+    def reset(self, patches=None):
+        super().reset(patches)
+        # The memory object is reused, so make execute() check the blocks against its new contents
+        self.compiled_memory = None
+
+    def execute(self, budget=None):
+        # A block always runs to its end, so this can overshoot budget by up to one block.
+        if self.debug:
+            # Compiled blocks can't log each instruction
+            return super().execute(budget)
+        if self.program_memory is not self.compiled_memory:
+            self.revalidate()
+        blocks = self.blocks
+        compiled_addresses = self.compiled_addresses
+        steps = 0
+        while self.running:
+            if budget is not None and steps >= budget:
+                break
+            block = blocks.get(self.instruction_pointer)
+            if block is None:
+                block = self.compile_block(self.instruction_pointer)
+            if block is not None:
+                memory = self.program_memory
+                self.instruction_pointer, self.relative_base, count = block(memory, memory.pages, self.relative_base)
+                steps += count
+                continue
+            # Interpreted instructions can write into compiled code too (e.g. once a block is past MAX_RECOMPILES)
+            _, _, input_modes, _ = self.decode(self.instruction_pointer)
+            inputs = self.step()
+            steps += 1
+            for (_, arg_type), address in zip(input_modes, inputs):
+                if arg_type == WRITE_PARAM and address in compiled_addresses:
+                    self.invalidate(address)
+        return steps
+
+    def invalidate(self, address):
+        # Park every block covering address
+        for start in self.compiled_addresses.get(address, ()):
+            self.blocks.pop(start, None)
+
+    def reinstate(self, start):
+        words = self.block_words[start]
+        if self.program_memory[start:start + len(words)] != words:
+            return None
+        self.blocks[start] = self.compiled_blocks[start]
+        return self.blocks[start]
+
+    def discard_block(self, start):
+        self.remove_block(start)
+        self.recompiles[start] = self.recompiles.get(start, 0) + 1
+
+    def remove_block(self, start):
+        self.unchecked_blocks.discard(start)
+        self.blocks.pop(start, None)
+        del self.compiled_blocks[start]
+        words = self.block_words.pop(start)
+        for address in range(start, start + len(words)):
+            starts = self.compiled_addresses[address]
+            starts.discard(start)
+            if not starts:
+                del self.compiled_addresses[address]
+
+    def compile_block(self, start):
+        """
+        Compile the basic block starting at start. Returns None if the instruction at start has to be interpreted.
+        """
+        if start in self.compiled_blocks:
+            block = self.reinstate(start)
+            if block is not None:
+                return block
+            self.discard_block(start)
+        if self.recompiles.get(start, 0) > MAX_RECOMPILES:
+            return None
+
+        memory = self.program_memory
+        lines = []
+        address = start
+        count = 0
+        ends_with_jump = False
+        unchecked = False
+        while address - start < MAX_BLOCK_LENGTH:
+            try:
+                code, input_modes = decode_opcode(memory[address])
+                values = memory[address + 1:address + 1 + len(input_modes)]
+            except (ValueError, IndexError):
+                # Leave the error for the interpreter to raise if this instruction is ever reached
+                break
+            if code in INTERPRETED_OPCODES or len(values) < len(input_modes):
+                break
+            next_address = address + 1 + len(input_modes)
+            count += 1
+            parameters = [
+                self.compile_parameter(mode, arg_type, value) for (mode, arg_type), value in zip(input_modes, values)
+            ]
+            if code in JUMP_OPCODES:
+                test, jump = parameters
+                lines.append("if {}{}:".format("" if code == 5 else "not ", test))
+                lines.append("    return {}, relative_base, {}".format(jump, count))
+                lines.append("return {}, relative_base, {}".format(next_address, count))
+                address = next_address
+                ends_with_jump = True
+                break
+            elif code == 9:
+                lines.append("relative_base += {}".format(parameters[0]))
+            else:
+                x, y, store = parameters
+                if code == 1:
+                    expression = "{} + {}".format(x, y)
+                elif code == 2:
+                    expression = "{} * {}".format(x, y)
+                elif code == 7:
+                    expression = "1 if {} < {} else 0".format(x, y)
+                else:
+                    expression = "1 if {} == {} else 0".format(x, y)
+                if not store.isdigit():
+                    lines.append("address = {}".format(store))
+                    store = "address"
+                lines.append("memory[{}] = {}".format(store, expression))
+                if store.isdigit() and int(store) in self.safe_stores:
+                    # The analysis proved this store can't reach code
+                    unchecked = True
+                else:
+                    # Writing into compiled code ends the block if the write hit code this block has still to run.
+                    # The end of the block isn't known yet, so it's filled in below.
+                    lines.append("if {} in compiled_addresses:".format(store))
+                    lines.append("    invalidate({})".format(store))
+                    lines.append("    if {} <= {} < {{end}}:".format(next_address, store))
+                    lines.append("        return {}, relative_base, {}".format(next_address, count))
+            address = next_address
+
+        if address == start:
+            return None
+        if not ends_with_jump:
+            lines.append("return {}, relative_base, {}".format(address, count))
+
+        source = "def block(memory, pages, relative_base):\n" + "".join(
+            "    {}\n".format(line.replace("{end}", str(address))) for line in lines
+        )
+        namespace = {"compiled_addresses": self.compiled_addresses, "invalidate": self.invalidate}
+        exec(compile(source, "<intcode block {}>".format(start), "exec"), namespace)
+        block = namespace["block"]
+
+        self.blocks[start] = block
+        self.compiled_blocks[start] = block
+        self.block_words[start] = memory[start:address]
+        if unchecked:
+            self.unchecked_blocks.add(start)
+        for covered in range(start, address):
+            self.compiled_addresses.setdefault(covered, set()).add(start)
+        return block
+
+    @staticmethod
+    def compile_parameter(mode, arg_type, value):
+        # Write parameters compile to the address expression, read parameters to the value expression.
+        # Reads index the memory pages directly rather than paying for a PagedMemory.__getitem__ call.
+        if mode == IMMEDIATE_MODE:
+            return str(value)
+        if mode == POSITION_MODE:
+            if arg_type == WRITE_PARAM:
+                return str(value)
+            if value < 0:
+                return "memory[{}]".format(value)
+            return "pages[{}][{}]".format(value >> PAGE_SHIFT, value & PAGE_MASK)
+        address = "relative_base + {}".format(value)
+        if arg_type == WRITE_PARAM:
+            return address
+        return "pages[({0}) >> {1}][({0}) & {2}]".format(address, PAGE_SHIFT, PAGE_MASK)
+
+
+def tests():
+    assert CompiledIntCodeComputer([1,9,10,3,2,3,11,0,99,30,40,50]).run()[0] == 3500
+    assert CompiledIntCodeComputer([1,0,0,0,99]).run() == [2,0,0,0,99]
+    assert CompiledIntCodeComputer([2,3,0,3,99]).run() == [2,3,0,6,99]
+    assert CompiledIntCodeComputer([2,4,4,5,99, 0]).run() == [2,4,4,5,99,9801]
+    assert CompiledIntCodeComputer([1,1,1,4,99,5,6,0,99]).run() == [30,1,1,4,2,5,6,0,99]
+
+    # Blocks compiled with one noun/verb must not leak into the next run
+    computer = CompiledIntCodeComputer([1, 1, 1, 4, 99, 5, 6, 0, 99])
+    assert computer.run() == [30, 1, 1, 4, 2, 5, 6, 0, 99]
+    assert computer.run(noun=0, verb=1) == [11, 0, 1, 4, 1, 5, 6, 0, 99]
+    computer.reset({1: 1, 2: 1})
+    computer.execute()
+    assert computer.program_memory == [30, 1, 1, 4, 2, 5, 6, 0, 99]
+
+    # Day 2 style sweep. The first block changes every run, so it ends up interpreted, while code that writes behind
+    # itself keeps its block.
+    program = [1, 0, 0, 3, 1, 1, 2, 3, 1, 3, 4, 3, 1, 5, 0, 3, 2, 1, 10, 19, 1, 19, 5, 23, 99]
+    computer = CompiledIntCodeComputer(program)
+    for noun in range(10):
+        assert computer.run(noun=noun, verb=3) == IntCodeComputer(program).run(noun=noun, verb=3)
+    assert 0 not in computer.compiled_blocks and 4 not in computer.recompiles
+
+    # Once the first block is left to the interpreter, its writes into compiled code still invalidate it
+    program = [1, 0, 0, 5, 1, 14, 12, 13, 4, 13, 99, 0, 100, 0, 7, 3, 4, 10, 4, 11, 9, 5, 1]
+    computer = CompiledIntCodeComputer(program)
+    for noun, verb in ((16, 17), (17, 16), (18, 17), (17, 18), (19, 15), (15, 19), (20, 18)):
+        outputs = []
+        computer.output_queue = outputs
+        computer.run(noun=noun, verb=verb)
+        expected = []
+        IntCodeComputer(program, output_queue=expected).run(noun=noun, verb=verb)
+        assert outputs == expected
+    assert outputs == [100]
+
+    comparison_program = [
+        3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+        1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+        999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+    ]
+    test_cases = [
+        ([3,12,6,12,15,1,13,14,13,4,13,99,-1,0,1,9], [0], [0]),
+        ([3,3,1105,-1,9,1101,0,0,12,4,12,99,1], [32], [1]),
+        (comparison_program, [7], [999]),
+        (comparison_program, [8], [1000]),
+        (comparison_program, [9], [1001]),
+        ([109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99], [], [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99]),
+        ([1102,34915192,34915192,7,4,7,99,0], [], [1219070632396864]),
+        ([1101,5,6,1000000000,4,1000000000,4,2000000000,99], [], [11, 0]),
+        # Self modifying. The add at address 0 is rewritten into a multiply and then re-executed.
+        ([1101, 3, 4, 24, 4, 24, 1005, 25, 23, 1101, 0, 1102, 0, 1101, 0, 1, 25, 1105, 1, 0, 99, 99, 99, 99, 0, 0], [], [7, 12]),
+        # Self modifying via input. The second pass through the add at address 0 reads the input as its operand.
+        ([1101, 0, 5, 20, 4, 20, 1005, 21, 18, 3, 1, 1101, 0, 1, 21, 1105, 1, 0, 99, 0, 0, 0], [10], [5, 15]),
+    ]
+    for program, inputs, expected_outputs in test_cases:
+        outputs = []
+        computer = CompiledIntCodeComputer(program, inputs, outputs)
+        computer.run()
+        try:
+            assert outputs == expected_outputs
+        except AssertionError:
+            print(program, outputs, expected_outputs)
+            raise
+
+    # Forked machines get their own blocks and see the snapshot's memory, not whatever the parent compiled
+    program = [1101, 0, 5, 20, 4, 20, 1005, 21, 18, 3, 1, 1101, 0, 1, 21, 1105, 1, 0, 99, 0, 0, 0]
+    computer = CompiledIntCodeComputer(program, [10], [])
+    computer.boot()
+    snapshot = computer.snapshot()
+    computer.resume()
+    assert computer.output_queue == [5, 15]
+    child = computer.fork(snapshot, input_queue=[20], output_queue=[])
+    child.resume()
+    assert child.output_queue == [5, 25]
+    assert child.blocks is not computer.blocks
+
+    # Generator I/O goes through the interpreter, and inputs written into compiled code still invalidate it
+    program = [1101, 0, 5, 20, 4, 20, 1005, 21, 18, 3, 1, 1101, 0, 1, 21, 1105, 1, 0, 99, 0, 0, 0]
+    machine = CompiledIntCodeComputer(program).interact()
+    assert next(machine) == 5
+    assert next(machine) == NEED_INPUT
+    assert machine.send(10) == 15
+
+    # Instruction budgets count the instructions inside compiled blocks
+    countdown = [1101, 0, 100, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    computer = CompiledIntCodeComputer(countdown, [], [])
+    computer.boot()
+    # The budget runs out part way through the loop block, which is still finished
+    assert computer.execute(budget=10) == 11
+    assert computer.execute() == 192
+    assert computer.output_queue == [0]
+
+    # Stores the analysis proves can't reach code run unchecked, until the code is patched so the proof no longer holds.
+    # The loop counts in 42. Patching the loop's jump back to go via 40 makes 42 the operand of a compiled add.
+    program = [1101, 0, 0, 42, 1001, 42, 1, 42, 1007, 42, 3, 51, 1006, 51, 18, 1105, 1, 4, 4, 50, 99]
+    program += [0] * 19 + [1101, 0, 0, 50, 1105, 1, 4] + [0] * 5
+    computer = CompiledIntCodeComputer(program, [], [])
+    computer.run()
+    assert computer.output_queue == [0] and computer.unchecked_blocks == {0, 4}
+    computer.reset({17: 40})
+    computer.execute()
+    assert computer.output_queue == [0, 2] and not computer.unchecked_blocks
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+    program = get_program(input_file)
+
+    computer = CompiledIntCodeComputer(program)
+    computer.run()
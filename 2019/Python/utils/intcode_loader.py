@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import struct
+import hashlib
+from array import array
+
+
+# Programs are cached in the __pycache__ directory next to the source file, like compiled Python modules.
+CACHE_DIRECTORY = "__pycache__"
+CACHE_SUFFIX = ".intcode"
+
+MAGIC = b"ICPG"
+VERSION = 1
+# Magic, version, source mtime (ns), source size, source sha256, number of values, length of the overflow section.
+# Then the values as little endian signed 64 bit ints, then the overflow section. Everything is little endian.
+HEADER = struct.Struct("<4sHqQ32sQQ")
+# Stored in place of values that don't fit in 64 bits. The real values are in the overflow section, a JSON object of
+# index -> value.
+OVERFLOW = -2 ** 63
+
+
+def parse_program(text):
+    # The comma separated intcode program on the first line of text
+    return [int(v) for v in text.split("\n", 1)[0].split(",")]
+
+
+def cache_path(filepath):
+    directory, filename = os.path.split(os.path.abspath(filepath))
+    return os.path.join(directory, CACHE_DIRECTORY, filename + CACHE_SUFFIX)
+
+
+def pack_program(program, mtime, size, digest):
+    values = array("q")
+    overflow = {}
+    for index, value in enumerate(program):
+        if -2 ** 63 < value < 2 ** 63:
+            values.append(value)
+        else:
+            values.append(OVERFLOW)
+            overflow[index] = value
+    if sys.byteorder == "big":
+        values.byteswap()
+    overflow_section = json.dumps(overflow).encode() if overflow else b""
+    header = HEADER.pack(MAGIC, VERSION, mtime, size, digest, len(values), len(overflow_section))
+    return header + values.tobytes() + overflow_section
+
+
+def unpack_program(data):
+    """
+    :return Tuple[int, int, bytes, List[int]]: The source mtime, size and sha256 the cache was made from, and the
+        program. Raises ValueError if data isn't a cached program.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated program cache")
+    magic, version, mtime, size, digest, count, overflow_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or len(data) != HEADER.size + 8 * count + overflow_length:
+        raise ValueError("Not a program cache")
+    values = array("q")
+    values.frombytes(data[HEADER.size:HEADER.size + 8 * count])
+    if sys.byteorder == "big":
+        values.byteswap()
+    program = values.tolist()
+    if overflow_length:
+        for index, value in json.loads(data[HEADER.size + 8 * count:]).items():
+            program[int(index)] = value
+    return mtime, size, digest, program
+
+
+def get_program(filepath, use_cache=True):
+    """
+    Load the comma separated intcode program from a file into memory (a list).
+
+    The parsed program is cached as packed binary. The cache is used as is while the source's mtime and size are
+    unchanged, and otherwise only if the source's hash still matches. Failing to read or write the cache is never an
+    error, the source is just parsed again.
+    :return List[int]:
+    """
+    if not use_cache:
+        with open(filepath) as f:
+            return parse_program(f.read())
+
+    stat = os.stat(filepath)
+    path = cache_path(filepath)
+    cached = None
+    try:
+        with open(path, "rb") as f:
+            cached = unpack_program(f.read())
+    except (OSError, ValueError):
+        pass
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[3]
+
+    with open(filepath, "rb") as f:
+        source = f.read()
+    digest = hashlib.sha256(source).digest()
+    if cached is not None and cached[2] == digest:
+        # Touched but not changed
+        program = cached[3]
+    else:
+        program = parse_program(source.decode())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary_path, "wb") as f:
+            f.write(pack_program(program, stat.st_mtime_ns, stat.st_size, digest))
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+    return program
+
+
+def tests():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "Input")
+        with open(source, "w") as f:
+            f.write("1,9,10,3,2,3,11,0,99,30,40,50\n")
+        assert get_program(source) == [1, 9, 10, 3, 2, 3, 11, 0, 99, 30, 40, 50]
+        assert os.path.exists(cache_path(source))
+        assert get_program(source) == [1, 9, 10, 3, 2, 3, 11, 0, 99, 30, 40, 50]
+
+        # Touching the source keeps the cached program (and updates the cache's mtime), changing it doesn't
+        stat = os.stat(source)
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert get_program(source)[0] == 1
+        with open(cache_path(source), "rb") as f:
+            assert unpack_program(f.read())[0] == stat.st_mtime_ns + 10 ** 9
+        with open(source, "w") as f:
+            f.write("2,9,10,3,2,3,11,0,99,30,40,50\n")
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        assert get_program(source)[0] == 2
+
+        # Values that don't fit in 64 bits
+        with open(source, "w") as f:
+            f.write("104,1125899906842624,104,{},104,{},99".format(2 ** 64, -2 ** 63))
+        expected = [104, 1125899906842624, 104, 2 ** 64, 104, -2 ** 63, 99]
+        assert get_program(source) == expected
+        assert get_program(source) == expected
+        assert unpack_program(pack_program(expected, 0, 0, bytes(32)))[3] == expected
+
+        # A broken cache file is ignored and replaced
+        with open(cache_path(source), "wb") as f:
+            f.write(b"ICPG")
+        assert get_program(source) == expected
+        assert get_program(source, use_cache=False) == expected
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
@@ -0,0 +1,350 @@
+from array import array
+from itertools import repeat
+
+
+PAGE_SHIFT = 10
+PAGE_SIZE = 1 << PAGE_SHIFT
+PAGE_MASK = PAGE_SIZE - 1
+
+# Shared, read only, stand in for every page that has never been written.
+ZERO_PAGE = (0,) * PAGE_SIZE
+
+
+def same_page(page, other):
+    # Pages can be lists, arrays or the zero page, which never compare equal to each other directly
+    return page == other if page.__class__ is other.__class__ else list(page) == list(other)
+
+
+class Pages(dict):
+    """
+    Page number -> page. Missing pages read as the zero page, so `pages[address >> PAGE_SHIFT][address & PAGE_MASK]`
+    is a valid read of any address without allocating anything.
+    """
+
+    def __missing__(self, page_number):
+        if page_number < 0:
+            raise IndexError("Negative address in page {}".format(page_number))
+        return ZERO_PAGE
+
+
+class PagedMemory:
+    """
+    Sparse, auto growing IntCode memory.
+    Pages are allocated on first write, reads of addresses that were never written return 0, so memory use tracks
+    the pages the program actually touches rather than the highest address it uses.
+
+    Iterating, comparing and printing walk the allocated pages, so a single write to a huge address doesn't make them
+    walk every address below it (iterating still yields every value up to len(), zeros included).
+
+    Memory can be forked. The fork shares every page with its parent and each side copies a page the first time it
+    writes to it, so forking costs a copy of the page table rather than of the memory.
+    """
+
+    def __init__(self, values=()):
+        self.pages = Pages()
+        # Page number -> page, for the pages this memory may write to in place (i.e. not shared with a fork)
+        self.owned = {}
+        # One past the highest address loaded or written. Used for len(), iteration and comparisons.
+        self.length = 0
+        self.load(values)
+
+    def load(self, values, start=0):
+        # Bulk copy values into memory a page at a time
+        values = list(values)
+        address = start
+        index = 0
+        while index < len(values):
+            page_number, offset = divmod(address, PAGE_SIZE)
+            count = min(PAGE_SIZE - offset, len(values) - index)
+            self.write_page(page_number, offset, values[index:index + count])
+            index += count
+            address += count
+        self.length = max(self.length, start + len(values))
+
+    @staticmethod
+    def new_page(source=None):
+        return [0] * PAGE_SIZE if source is None else list(source)
+
+    def write_page(self, page_number, offset, values):
+        self.writable_page(page_number)[offset:offset + len(values)] = values
+
+    def writable_page(self, page_number):
+        page = self.owned.get(page_number)
+        if page is None:
+            page = self.new_page(self.pages.get(page_number))
+            self.pages[page_number] = page
+            self.owned[page_number] = page
+        return page
+
+    def fork(self):
+        child = self.__class__()
+        child.pages.update(self.pages)
+        child.length = self.length
+        # Every page is now shared, so neither side may write to them in place any more
+        self.owned = {}
+        return child
+
+    def reset(self, image):
+        """
+        Make this memory a copy of image, reusing the pages it already owns: each page of image is copied into the
+        matching page here with one slice assignment, and owned pages image doesn't have are zeroed and kept for the
+        next time they're needed. Only pages shared with a fork (or missing) are allocated.
+        :param PagedMemory -> image:
+        """
+        for page_number in list(self.pages):
+            if page_number in image.pages:
+                continue
+            if page_number in self.owned:
+                self.write_page(page_number, 0, ZERO_PAGE)
+            else:
+                del self.pages[page_number]
+        for page_number, source in image.pages.items():
+            if page_number in self.owned:
+                self.write_page(page_number, 0, source)
+            else:
+                page = self.new_page(source)
+                self.pages[page_number] = page
+                self.owned[page_number] = page
+        self.length = image.length
+
+    @property
+    def allocated_pages(self):
+        return len(self.pages)
+
+    def page_map(self):
+        """
+        :return Dict[int, List[int]]: Page number -> values, for the allocated pages
+        """
+        return {page_number: list(page) for page_number, page in sorted(self.pages.items())}
+
+    @classmethod
+    def from_page_map(cls, page_map, length):
+        memory = cls()
+        for page_number, values in page_map.items():
+            memory.write_page(int(page_number), 0, values)
+        memory.length = length
+        return memory
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            start, stop, step = address.indices(self.length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            values = []
+            while start < stop:
+                page_number, offset = divmod(start, PAGE_SIZE)
+                count = min(PAGE_SIZE - offset, stop - start)
+                values.extend(self.pages[page_number][offset:offset + count])
+                start += count
+            return values
+        if address < 0:
+            raise IndexError("Negative address {}".format(address))
+        return self.pages[address >> PAGE_SHIFT][address & PAGE_MASK]
+
+    def __setitem__(self, address, value):
+        if address < 0:
+            raise IndexError("Negative address {}".format(address))
+        page = self.owned.get(address >> PAGE_SHIFT)
+        if page is None:
+            page = self.writable_page(address >> PAGE_SHIFT)
+        page[address & PAGE_MASK] = value
+        if address >= self.length:
+            self.length = address + 1
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        # A page at a time. Runs of pages that were never written are yielded as zeros without looking them up.
+        address = 0
+        for page_number in sorted(self.pages):
+            start = page_number << PAGE_SHIFT
+            if start >= self.length:
+                break
+            yield from repeat(0, start - address)
+            page = self.pages[page_number]
+            address = min(start + PAGE_SIZE, self.length)
+            yield from page if address - start == PAGE_SIZE else page[:address - start]
+        yield from repeat(0, self.length - address)
+
+    def __eq__(self, other):
+        if isinstance(other, PagedMemory):
+            # Pages missing on either side read as zeros, so only the allocated pages need comparing
+            if self.length != other.length:
+                return False
+            pages, other_pages = self.pages, other.pages
+            return all(same_page(pages[page_number], other_pages[page_number])
+                       for page_number in pages.keys() | other_pages.keys())
+        try:
+            values = list(other)
+        except TypeError:
+            return NotImplemented
+        return len(values) == self.length and self[:] == values
+
+    def __repr__(self):
+        return "{}({}, length={})".format(self.__class__.__name__, self.page_map(), self.length)
+
+
+# Typed pages hold signed 64 bit words
+WORD_TYPE = "q"
+ZERO_ARRAY = array(WORD_TYPE, ZERO_PAGE)
+
+
+class TypedPagedMemory(PagedMemory):
+    """
+    PagedMemory whose pages are array('q') rather than lists, so a word costs 8 bytes instead of a pointer to a boxed
+    int, and page copies (loads, resets, copy-on-write after a fork) are flat memory copies.
+
+    A page that's asked to store a value that doesn't fit in 64 bits is promoted to a plain list on the spot, so results
+    stay exact. Only that page pays for it; every other page stays compact.
+    """
+
+    def __init__(self, values=()):
+        self.promoted_pages = 0
+        super().__init__(values)
+
+    @staticmethod
+    def new_page(source=None):
+        if source is None:
+            return ZERO_ARRAY[:]
+        if source.__class__ is array:
+            return source[:]
+        try:
+            return array(WORD_TYPE, source)
+        except OverflowError:
+            return list(source)
+
+    def promote(self, page_number):
+        # Swap the page for a list that can hold integers of any size
+        page = list(self.writable_page(page_number))
+        self.pages[page_number] = page
+        self.owned[page_number] = page
+        self.promoted_pages += 1
+        return page
+
+    def write_page(self, page_number, offset, values):
+        page = self.writable_page(page_number)
+        if page.__class__ is array:
+            if values is ZERO_PAGE:
+                values = ZERO_ARRAY
+            try:
+                page[offset:offset + len(values)] = values if values.__class__ is array else array(WORD_TYPE, values)
+                return
+            except OverflowError:
+                page = self.promote(page_number)
+        page[offset:offset + len(values)] = values
+
+    def __setitem__(self, address, value):
+        if address < 0:
+            raise IndexError("Negative address {}".format(address))
+        page = self.owned.get(address >> PAGE_SHIFT)
+        if page is None:
+            page = self.writable_page(address >> PAGE_SHIFT)
+        try:
+            page[address & PAGE_MASK] = value
+        except OverflowError:
+            self.promote(address >> PAGE_SHIFT)[address & PAGE_MASK] = value
+        if address >= self.length:
+            self.length = address + 1
+
+
+def tests():
+    import time
+
+    memory = PagedMemory([1, 2, 3])
+    assert memory == [1, 2, 3]
+    assert memory[1] == 2
+    assert memory[10 ** 12] == 0
+    assert memory.allocated_pages == 1
+
+    # Sparse writes only allocate the page they land on
+    memory[10 ** 12] = 5
+    assert memory[10 ** 12] == 5
+    assert memory.allocated_pages == 2
+    assert len(memory) == 10 ** 12 + 1
+
+    # Loads that span page boundaries
+    memory = PagedMemory()
+    memory.load(range(PAGE_SIZE * 2 + 10), start=5)
+    assert memory[5] == 0
+    assert memory[PAGE_SIZE * 2 + 14] == PAGE_SIZE * 2 + 9
+    assert memory[3:7] == [0, 0, 0, 1]
+    assert memory[PAGE_SIZE - 2:PAGE_SIZE + 2] == list(range(PAGE_SIZE - 7, PAGE_SIZE - 3))
+    assert memory[0:10:3] == [0, 0, 1, 4]
+
+    # Forks share pages until either side writes
+    parent = PagedMemory([1, 2, 3])
+    child = parent.fork()
+    assert child.pages[0] is parent.pages[0]
+    child[0] = 10
+    parent[1] = 20
+    assert child == [10, 2, 3]
+    assert parent == [1, 20, 3]
+    assert child.pages[0] is not parent.pages[0]
+
+    # Resetting copies into the pages already owned, and leaves pages shared with a fork alone
+    image = PagedMemory([1, 2, 3])
+    memory = PagedMemory([7, 8, 9, 10])
+    memory[PAGE_SIZE] = 4
+    first_page, second_page = memory.pages[0], memory.pages[1]
+    memory.reset(image)
+    assert memory == [1, 2, 3] and memory[PAGE_SIZE] == 0
+    assert memory.pages[0] is first_page and memory.pages[1] is second_page
+    child = memory.fork()
+    memory.reset(PagedMemory([5]))
+    assert memory == [5] and child == [1, 2, 3]
+    assert memory.pages[0] is not child.pages[0] and 1 not in memory.pages
+
+    # Typed pages: values past 64 bits promote just the page they land on
+    memory = TypedPagedMemory([1102, 34915192, 34915192, 7, 4, 7, 99, 0])
+    assert memory.pages[0].__class__ is array
+    memory[7] = 34915192 * 34915192
+    assert memory[7] == 1219070632396864 and memory.promoted_pages == 0
+    memory[PAGE_SIZE] = 2 ** 63
+    memory[PAGE_SIZE + 1] = -2 ** 70
+    assert memory[PAGE_SIZE:PAGE_SIZE + 2] == [2 ** 63, -2 ** 70]
+    assert memory.pages[1].__class__ is list and memory.pages[0].__class__ is array
+    assert memory.promoted_pages == 1
+    memory.load([2 ** 64, 5], start=2 * PAGE_SIZE)
+    assert memory[2 * PAGE_SIZE:2 * PAGE_SIZE + 2] == [2 ** 64, 5] and memory.promoted_pages == 2
+
+    # Forks and resets keep the typed pages, and each side's values
+    child = memory.fork()
+    assert child.__class__ is TypedPagedMemory
+    child[0] = 2 ** 65
+    assert memory[0] == 1102 and child[0] == 2 ** 65
+    image = TypedPagedMemory([1, 2, 3])
+    child.reset(image)
+    assert child == [1, 2, 3] and child[PAGE_SIZE] == 0
+    memory.reset(image)
+    assert memory == [1, 2, 3] and memory.pages[0].__class__ is array
+
+    # A single write to a huge address: comparing, copying and printing only touch the allocated pages
+    start = time.perf_counter()
+    memory = PagedMemory([1, 2, 3])
+    memory[10 ** 9] = 4
+    other = memory.fork()
+    assert memory == other and memory != [1, 2, 3]
+    other[10 ** 9] = 5
+    assert memory != other
+    assert PagedMemory.from_page_map(memory.page_map(), len(memory)) == memory
+    assert TypedPagedMemory.from_page_map(memory.page_map(), len(memory)) == memory
+    assert "length=1000000001" in repr(memory)
+    assert time.perf_counter() - start < 1
+    assert list(PagedMemory([1, 2, 3])) == [1, 2, 3]
+    memory = PagedMemory([1, 2])
+    memory[2 * PAGE_SIZE + 1] = 3
+    assert list(memory) == [1, 2] + [0] * (2 * PAGE_SIZE - 1) + [3]
+
+    try:
+        memory[-1]
+    except IndexError:
+        pass
+    else:
+        raise AssertionError("Negative addresses should be invalid")
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
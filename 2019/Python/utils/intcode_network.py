@@ -0,0 +1,153 @@
+from collections import deque
+
+from utils.intcode_computer import IntCodeComputer, NEED_INPUT, TIME_SLICE_EXPIRED
+
+
+class IntCodeNetwork:
+    """
+    A directed graph of IntCode machines connected by named channels, e.g. pipelines, rings, fan-in (several machines
+    writing to one channel) and fan-out (one machine writing to several channels).
+
+    All machines are driven cooperatively from the calling thread (see IntCodeComputer.interact): a machine runs until
+    it is blocked on an empty channel, halts, or has used its time slice, and then the next ready machine gets a turn.
+    With the GIL a pool of scheduler threads can't run the interpreters any faster than one, so none are used.
+    run() returns once no machine can make progress, either because they have all halted or because the remaining
+    ones are all waiting on empty channels.
+    """
+
+    def __init__(self, time_slice=1000):
+        self.time_slice = time_slice
+        # Channel name -> values waiting to be read
+        self.channels = {}
+        # Machine name -> (machine, input channel, output channels)
+        self.machines = {}
+        # Machine names in the order they finished / got stuck, after run()
+        self.halted = []
+        self.blocked = []
+
+    def add_channel(self, name, values=()):
+        self.channels[name] = deque(values)
+
+    def add_machine(self, name, computer, input_channel=None, output_channels=()):
+        """
+        :param Hashable -> name:
+        :param IntCodeComputer -> computer:
+        :param Hashable -> input_channel: Channel the machine reads from. Created if needed.
+        :param Iterable[Hashable] -> output_channels: Channels every output value is copied to. Created if needed.
+        """
+        output_channels = tuple(output_channels)
+        for channel in (input_channel,) + output_channels:
+            if channel is not None and channel not in self.channels:
+                self.add_channel(channel)
+        self.machines[name] = (computer, input_channel, output_channels)
+
+    @property
+    def deadlocked(self):
+        return bool(self.blocked)
+
+    def run(self, resume=False):
+        """
+        :param bool -> resume: Carry on from each machine's current state (e.g. after reset) instead of booting it
+        :return Dict[Hashable, List[int]]: What is left in each channel.
+        """
+        generators = {
+            name: computer.interact(resume=resume, time_slice=self.time_slice)
+            for name, (computer, _, _) in self.machines.items()
+        }
+        # Machine name -> value to send it when it next runs
+        to_send = {name: None for name in generators}
+        ready = deque(generators)
+        # Channel name -> machines blocked reading it
+        waiting = {}
+        self.halted = []
+        self.blocked = []
+
+        while ready:
+            name = ready.popleft()
+            machine = generators[name]
+            _, input_channel, output_channels = self.machines[name]
+            while True:
+                try:
+                    event = machine.send(to_send[name])
+                except StopIteration:
+                    self.halted.append(name)
+                    break
+                to_send[name] = None
+                if event == TIME_SLICE_EXPIRED:
+                    ready.append(name)
+                    break
+                elif event == NEED_INPUT:
+                    channel = self.channels.get(input_channel)
+                    if channel is None:
+                        raise RuntimeError("{} has no input channel".format(name))
+                    if channel:
+                        to_send[name] = channel.popleft()
+                        continue
+                    # Park it and re-ask for input when it's woken up
+                    waiting.setdefault(input_channel, deque()).append(name)
+                    to_send[name] = None
+                    break
+                else:
+                    for output_channel in output_channels:
+                        self.channels[output_channel].append(event)
+                        readers = waiting.get(output_channel)
+                        if readers:
+                            ready.append(readers.popleft())
+
+        # Whatever is still parked is waiting on a channel nothing will ever write to
+        for readers in waiting.values():
+            self.blocked.extend(readers)
+        return {name: list(values) for name, values in self.channels.items()}
+
+
+def tests():
+    # Pipeline: add one, then double
+    add_one = [3, 9, 1001, 9, 1, 9, 4, 9, 99, 0]
+    double = [3, 9, 1002, 9, 2, 9, 4, 9, 99, 0]
+    network = IntCodeNetwork()
+    network.add_channel("in", [5])
+    network.add_machine("add", IntCodeComputer(add_one), "in", ["middle"])
+    network.add_machine("double", IntCodeComputer(double), "middle", ["out"])
+    assert network.run() == {"in": [], "middle": [], "out": [12]}
+    assert sorted(network.halted) == ["add", "double"] and not network.deadlocked
+
+    # Fan-out and fan-in: one source feeding both, both writing to the same sink
+    source = [104, 7, 99]
+    network = IntCodeNetwork()
+    network.add_machine("source", IntCodeComputer(source), None, ["a", "b"])
+    network.add_machine("add", IntCodeComputer(add_one), "a", ["sink"])
+    network.add_machine("double", IntCodeComputer(double), "b", ["sink"])
+    assert sorted(network.run()["sink"]) == [8, 14]
+
+    # Ring (Day 7 feedback loop)
+    feedback_program = [
+        3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27,
+        4, 27, 1001, 28, -1, 28, 1005, 28, 6, 99, 0, 0, 5
+    ]
+    network = IntCodeNetwork(time_slice=5)
+    for i, phase_setting in enumerate((9, 8, 7, 6, 5)):
+        network.add_channel(i, [phase_setting])
+    network.channels[0].append(0)
+    for i in range(5):
+        network.add_machine(i, IntCodeComputer(feedback_program), i, [(i + 1) % 5])
+    assert network.run()[0] == [139629729]
+
+    # Deadlock: two machines each waiting on the other
+    network = IntCodeNetwork()
+    network.add_machine("a", IntCodeComputer(add_one), "x", ["y"])
+    network.add_machine("b", IntCodeComputer(add_one), "y", ["x"])
+    network.run()
+    assert network.deadlocked and sorted(network.blocked) == ["a", "b"]
+
+    # Dozens of machines in one long pipeline
+    network = IntCodeNetwork()
+    network.add_channel(0, [0])
+    for i in range(50):
+        network.add_machine(i, IntCodeComputer(add_one), i, [i + 1])
+    assert network.run()[50] == [50]
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
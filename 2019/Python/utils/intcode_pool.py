@@ -0,0 +1,101 @@
+from utils.intcode_computer import IntCodeComputer
+
+
+class MachinePool:
+    """
+    Machines for one program, kept between runs so that sweeps don't build a machine, copy the program and allocate
+    memory for every run. A machine handed out by acquire() has been reset (see IntCodeComputer.reset), so its memory
+    is restored into the buffers of its last run, and its decode caches are still warm.
+
+    Not thread safe: use one pool per thread.
+    """
+
+    def __init__(self, program, computer_class=IntCodeComputer, name="Pooled"):
+        self.program = program
+        self.computer_class = computer_class
+        self.name = name
+        self.free = []
+        self.created = 0
+
+    def acquire(self, patches=None, input_queue=None, output_queue=None):
+        """
+        :param Dict[int, int] -> patches: Memory changes (address -> value) to make before running, e.g. noun and verb
+        :return IntCodeComputer: Booted and ready to execute()
+        """
+        if self.free:
+            machine = self.free.pop()
+        else:
+            self.created += 1
+            machine = self.computer_class(self.program, name="{} {}".format(self.name, self.created))
+        machine.input_queue = input_queue
+        machine.output_queue = output_queue
+        machine.reset(patches)
+        return machine
+
+    def release(self, machine):
+        machine.input_queue = None
+        machine.output_queue = None
+        self.free.append(machine)
+
+    def run(self, patches=None, inputs=()):
+        """
+        Run the program to completion on a pooled machine.
+        :return List[int]: The outputs. The machine's memory is reused, so it can't be returned.
+        """
+        outputs = []
+        machine = self.acquire(patches, list(inputs), outputs)
+        try:
+            machine.execute()
+        finally:
+            self.release(machine)
+        return outputs
+
+
+def tests():
+    from utils.intcode_jit import CompiledIntCodeComputer
+
+    # Day 2 style sweep on one machine, checked against fresh machines
+    program = [1, 0, 0, 3, 1, 1, 2, 3, 1, 3, 4, 3, 1, 5, 0, 3, 2, 1, 10, 19, 1, 19, 5, 23, 99]
+    for computer_class in (IntCodeComputer, CompiledIntCodeComputer):
+        pool = MachinePool(program, computer_class)
+        for noun in range(5):
+            for verb in range(5):
+                machine = pool.acquire({1: noun, 2: verb})
+                machine.execute()
+                assert machine.program_memory == IntCodeComputer(program).run(noun, verb)
+                pool.release(machine)
+        assert pool.created == 1
+    assert program[1:3] == [0, 0]
+
+    # Memory written beyond the program by one run doesn't leak into the next
+    program = [3, 100, 4, 100, 4, 200, 1101, 0, 7, 200, 99]
+    pool = MachinePool(program)
+    assert pool.run(inputs=[5]) == [5, 0]
+    assert pool.run(inputs=[6]) == [6, 0]
+
+    # Several machines in use at once
+    first = pool.acquire(input_queue=[1], output_queue=[])
+    second = pool.acquire(input_queue=[2], output_queue=[])
+    first.execute()
+    second.execute()
+    assert first.output_queue == [1, 0] and second.output_queue == [2, 0]
+    pool.release(first)
+    pool.release(second)
+    assert pool.created == 2
+
+    # A machine cancelled during its last run is handed out ready to run again
+    import queue
+    import threading
+    machine = pool.acquire(input_queue=queue.Queue(), output_queue=[])
+    machine.cancel()
+    pool.release(machine)
+    machine = pool.acquire(input_queue=queue.Queue(), output_queue=[])
+    threading.Timer(0.05, machine.input_queue.put, (3,)).start()
+    machine.execute()
+    assert machine.output_queue == [3, 0]
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
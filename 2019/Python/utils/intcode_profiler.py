@@ -0,0 +1,220 @@
+import os
+import json
+import time
+
+from utils.intcode_computer import IntCodeComputer, get_program, OPCODES, IMMEDIATE_MODE, READ_PARAM, WRITE_PARAM
+
+
+class ProfilingIntCodeComputer(IntCodeComputer):
+    """
+    IntCode computer that profiles what it executes, for finding hot loops.
+
+    The only per instruction bookkeeping is an address hit count and the highest address touched. Counts per opcode
+    and memory reads/writes are worked out from the hit counts and the decoded instructions when report() is called
+    (and whenever self modifying code replaces an instruction that has already been counted).
+
+    It dispatches superinstructions like IntCodeComputer does, crediting a hit to each instruction a superinstruction
+    actually ran, so the counts stay exact and profiling costs about 10% over the default loop.
+    """
+
+    def __init__(self, program, input_queue=None, output_queue=None, name="ProfilingIntCodeComputer", debug=False,
+                 log=None):
+        super().__init__(program, input_queue, output_queue, name=name, debug=debug, log=log)
+
+    def clear_caches(self):
+        # A fork starts with caches and a profile of its own rather than adding to its parent's
+        super().clear_caches()
+        # Start address -> address of each instruction in the superinstruction dispatched there
+        self.members = {}
+        # Address -> start addresses of the superinstructions that include it
+        self.member_of = {}
+        self.reset_profile()
+
+    def reset_profile(self):
+        # Address -> times an instruction at that address was executed
+        self.address_hits = {}
+        # Address -> address_hits when the instruction currently cached at that address was decoded
+        self.decoded_at = {}
+        # Totals for instructions that have since been overwritten
+        self.settled_opcodes = {}
+        self.settled_reads = 0
+        self.settled_writes = 0
+        self.peak_address = 0
+        self.instructions = 0
+        self.seconds = 0.0
+
+    def execute(self, budget=None):
+        # Same loop as IntCodeComputer.execute, plus the profiling.
+        start = time.perf_counter()
+        dispatch_cache = self.dispatch_cache
+        members = self.members
+        address_hits = self.address_hits
+        peak_address = self.peak_address
+        limit = float("inf") if budget is None else budget
+        steps = 0
+        try:
+            while self.running:
+                instruction_pointer = self.instruction_pointer
+                opcode = self.program_memory[instruction_pointer]
+                instruction = dispatch_cache.get(instruction_pointer)
+                if instruction is None or instruction[0] != opcode:
+                    instruction = self.decode_fused(instruction_pointer)
+                _, method, input_modes, length, count = instruction
+                inputs = self.get_inputs(input_modes)
+                if inputs:
+                    highest = max(inputs)
+                    if highest > peak_address:
+                        peak_address = highest
+                ran = method(*inputs)
+                if count == 1:
+                    address_hits[instruction_pointer] = address_hits.get(instruction_pointer, 0) + 1
+                else:
+                    # A superinstruction that stops short says how many of its instructions ran
+                    if ran is not None:
+                        count = ran
+                    for address in members[instruction_pointer][:count]:
+                        address_hits[address] = address_hits.get(address, 0) + 1
+                if self.next_instruction_pointer is None:
+                    self.instruction_pointer += length
+                else:
+                    self.instruction_pointer = self.next_instruction_pointer
+                    self.next_instruction_pointer = None
+                steps += count
+                if steps >= limit:
+                    break
+        finally:
+            self.peak_address = peak_address
+            self.instructions += steps
+            self.seconds += time.perf_counter() - start
+        return steps
+
+    def decode(self, address):
+        stale_instruction = self.instruction_cache.get(address)
+        instruction = super().decode(address)
+        if instruction is not stale_instruction:
+            # Credit the hits so far to the instruction being replaced, and stop dispatching anything that would
+            # credit hits at address to it
+            if stale_instruction is not None:
+                name, hits, reads, writes = self.instruction_counts(address, stale_instruction)
+                if hits:
+                    self.settled_opcodes[name] = self.settled_opcodes.get(name, 0) + hits
+                self.settled_reads += reads
+                self.settled_writes += writes
+            self.decoded_at[address] = self.address_hits.get(address, 0)
+            self.dispatch_cache.pop(address, None)
+            for start in self.member_of.pop(address, ()):
+                self.dispatch_cache.pop(start, None)
+        return instruction
+
+    def decode_fused(self, address):
+        fused = super().decode_fused(address)
+        if fused[4] > 1:
+            # Decode each instruction of the superinstruction too, so their hits are credited to what ran
+            addresses = [address]
+            while len(addresses) < fused[4]:
+                addresses.append(addresses[-1] + self.decode(addresses[-1])[3])
+            self.decode(addresses[-1])
+            self.members[address] = addresses
+            for member in addresses:
+                self.member_of.setdefault(member, set()).add(address)
+            self.dispatch_cache[address] = fused
+        return fused
+
+    def instruction_counts(self, address, instruction):
+        # (opcode name, hits, memory reads, memory writes) for instruction since it was decoded at address
+        hits = self.address_hits.get(address, 0) - self.decoded_at.get(address, 0)
+        opcode, _, input_modes, _ = instruction
+        reads = sum(1 for mode, arg in input_modes if arg == READ_PARAM and mode != IMMEDIATE_MODE)
+        writes = sum(1 for _, arg in input_modes if arg == WRITE_PARAM)
+        return OPCODES[opcode % 100][0], hits, reads * hits, writes * hits
+
+    def report(self, hot_addresses=10):
+        """
+        :return Dict: JSON serialisable profile of everything executed since the last reset_profile().
+        """
+        opcode_counts = dict(self.settled_opcodes)
+        memory_reads = self.settled_reads
+        memory_writes = self.settled_writes
+        for address, instruction in self.instruction_cache.items():
+            name, hits, reads, writes = self.instruction_counts(address, instruction)
+            if hits:
+                opcode_counts[name] = opcode_counts.get(name, 0) + hits
+                memory_reads += reads
+                memory_writes += writes
+
+        if self.program_memory is not None:
+            peak_address = max(self.peak_address, len(self.program_memory) - 1)
+        else:
+            peak_address = self.peak_address
+        hottest = sorted(self.address_hits.items(), key=lambda hit: hit[1], reverse=True)[:hot_addresses]
+        return {
+            "name": self.name,
+            "instructions": self.instructions,
+            "seconds": self.seconds,
+            "instructions_per_second": self.instructions / self.seconds if self.seconds else 0.0,
+            "opcodes": opcode_counts,
+            "memory_reads": memory_reads,
+            "memory_writes": memory_writes,
+            "peak_address": peak_address,
+            "hot_addresses": [[address, hits] for address, hits in hottest],
+            "address_hits": {str(address): hits for address, hits in sorted(self.address_hits.items())},
+        }
+
+
+def tests():
+    countdown = [1101, 0, 100, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    computer = ProfilingIntCodeComputer(countdown, [], [])
+    computer.run()
+    report = computer.report()
+    assert computer.output_queue == [0]
+    assert report["instructions"] == 203
+    assert report["opcodes"] == {"add": 101, "jump_if_true": 100, "output": 1, "halt": 1}
+    assert report["hot_addresses"][:2] == [[4, 100], [8, 100]]
+    # 1001 reads 1, 1005 reads 1 (its target is immediate), 4 reads 1; 1101 and 1001 write
+    assert report["memory_reads"] == 100 + 100 + 1
+    assert report["memory_writes"] == 101
+    assert report["peak_address"] == 100
+    json.dumps(report)
+
+    # Self modifying code is counted against the instruction that was actually run
+    program = [1101, 3, 4, 24, 4, 24, 1005, 25, 23, 1101, 0, 1102, 0, 1101, 0, 1, 25, 1105, 1, 0, 99, 99, 99, 99, 0, 0]
+    computer = ProfilingIntCodeComputer(program, [], [])
+    computer.run()
+    report = computer.report()
+    assert report["opcodes"]["multiply"] == 1
+    assert report["opcodes"]["add"] == 3
+    assert report["address_hits"]["0"] == 2
+    # Reporting doesn't disturb the counts
+    assert computer.report()["opcodes"] == report["opcodes"]
+
+    # A superinstruction that stops short only counts what it ran: the add rewrites the jump's target, so the jump
+    # is decoded afresh and run on its own
+    computer = ProfilingIntCodeComputer([1101, 0, 9, 6, 1105, 1, 0, 99, 99, 104, 5, 99], [], [])
+    computer.run()
+    report = computer.report()
+    assert computer.output_queue == [5]
+    assert report["opcodes"] == {"add": 1, "jump_if_true": 1, "output": 1, "halt": 1}
+    assert report["address_hits"] == {"0": 1, "4": 1, "9": 1, "11": 1}
+
+    # A fork profiles into counts of its own
+    computer = ProfilingIntCodeComputer(countdown, [], [])
+    computer.boot()
+    computer.execute(budget=11)
+    parent_hits = dict(computer.address_hits)
+    child = computer.fork()
+    child.resume()
+    assert computer.address_hits == parent_hits and computer.report()["instructions"] == 11
+    assert child.report()["instructions"] == 192 and child.output_queue == [0]
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+    program = get_program(input_file)
+
+    computer = ProfilingIntCodeComputer(program)
+    computer.run()
+    print(json.dumps(computer.report(), indent=2))
@@ -0,0 +1,196 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from itertools import islice, product
+
+from utils.intcode_computer import get_program
+from utils.intcode_jit import CompiledIntCodeComputer
+
+
+# Per worker process state, set once by init_worker so the program isn't shipped with every task.
+# worker_function is the predicate for parallel_search, or the objective for parallel_maximize.
+worker_computer = None
+worker_function = None
+worker_found = None
+
+
+def init_worker(program, function, found, computer_class):
+    global worker_computer, worker_function, worker_found
+    worker_computer = computer_class(program)
+    worker_function = function
+    worker_found = found
+
+
+def search_chunk(candidates):
+    # Returns a 1-tuple holding the matching candidate, or None. Gives up as soon as any worker has found a match.
+    for candidate in candidates:
+        if worker_found.is_set():
+            return None
+        if worker_function(worker_computer, candidate):
+            worker_found.set()
+            return (candidate,)
+    return None
+
+
+def maximize_chunk(candidates):
+    # The best (score, candidate) in the chunk, the first of them if there's a tie
+    best = None
+    for candidate in candidates:
+        score = worker_function(worker_computer, candidate)
+        if best is None or score > best[0]:
+            best = (score, candidate)
+    return best
+
+
+def chunked(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_search(program, search_space, predicate, workers=None, chunk_size=100,
+                    computer_class=CompiledIntCodeComputer):
+    """
+    Search for a candidate for which predicate(computer, candidate) is true, spreading the search space over a pool of
+    processes. Each worker builds one computer for the program up front and reuses it for all its candidates, and
+    every worker stops as soon as one of them finds a match.
+
+    predicate must be picklable (i.e. a module level function, or a functools.partial of one).
+    :param List[int] -> program:
+    :param Iterable -> search_space:
+    :param Callable[[IntCodeComputer, Any], bool] -> predicate:
+    :return: A matching candidate, or None if there isn't one. Which match is returned is not defined if there are
+        several.
+    """
+    workers = workers or os.cpu_count()
+    found = multiprocessing.Event()
+    chunks = chunked(search_space, chunk_size)
+    result = None
+    with ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(program, predicate, found, computer_class)
+    ) as executor:
+        pending = set()
+        while True:
+            # Keep a couple of chunks queued per worker rather than submitting the whole (possibly huge) space
+            while not found.is_set() and len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.add(executor.submit(search_chunk, chunk))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                match = future.result()
+                if match is not None and result is None:
+                    result = match[0]
+            if result is not None:
+                found.set()
+                for future in pending:
+                    future.cancel()
+                break
+    return result
+
+
+def parallel_maximize(program, search_space, objective, workers=None, chunk_size=100,
+                      computer_class=CompiledIntCodeComputer):
+    """
+    Find the candidate with the highest objective(computer, candidate), spreading the search space over a pool of
+    processes in the same way as parallel_search. Each worker reports only the best result of each chunk.
+
+    computer_class is anything built from the program that objective can use, e.g. a circuit of several machines.
+    It and objective must be picklable.
+    :return: (candidate, score), or None if the search space is empty. Ties go to the candidate that comes first in
+        search_space, as they would for a sequential search.
+    """
+    workers = workers or os.cpu_count()
+    chunks = enumerate(chunked(search_space, chunk_size))
+    # (score, -chunk index, candidate), so that ties go to the earliest chunk
+    best = None
+    with ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(program, objective, None, computer_class)
+    ) as executor:
+        pending = {}
+        while True:
+            while len(pending) < workers * 2:
+                index, chunk = next(chunks, (None, None))
+                if chunk is None:
+                    break
+                pending[executor.submit(maximize_chunk, chunk)] = index
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                score, candidate = future.result()
+                if best is None or (score, -index) > best[:2]:
+                    best = (score, -index, candidate)
+    if best is None:
+        return None
+    return best[2], best[0]
+
+
+def output_equals(desired_output, computer, candidate):
+    # Day 2 check: does running with (noun, verb) leave desired_output in address 0?
+    noun, verb = candidate
+    memory = computer.run(noun=noun, verb=verb)
+    return memory is not None and memory[0] == desired_output
+
+
+def address_0(computer, candidate):
+    noun, verb = candidate
+    return computer.run(noun=noun, verb=verb)[0]
+
+
+def parallel_noun_verb_search(program, desired_output, workers=None):
+    candidates = product(range(100), range(100))
+    match = parallel_search(program, candidates, partial(output_equals, desired_output), workers=workers)
+    if match is None:
+        raise ValueError("Desired value {} is unreachable!".format(desired_output))
+    return match
+
+
+def tests():
+    program = [1, 0, 0, 3, 1, 1, 2, 3, 1, 3, 4, 3, 1, 5, 0, 3, 2, 1, 10, 19, 1, 19, 5, 23, 99]
+    computer = CompiledIntCodeComputer(program)
+    noun, verb = parallel_noun_verb_search(program, computer.run(noun=13, verb=7)[0], workers=2)
+    assert computer.run(noun=noun, verb=verb)[0] == computer.run(noun=13, verb=7)[0]
+
+    try:
+        parallel_noun_verb_search(program, -1, workers=2)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected the search to fail")
+
+    # Any search space and predicate. The match is early in a space far too large to search, so this only finishes
+    # if the workers stop once it's found.
+    match = parallel_search(
+        program, product(range(10 ** 6), range(100)), partial(output_equals, computer.run(noun=0, verb=5)[0]),
+        workers=2
+    )
+    assert match is not None
+
+    # Maximizing. max() also gives the first of any ties.
+    candidates = list(product(range(20), range(20)))
+    best = max(candidates, key=lambda candidate: computer.run(*candidate)[0])
+    assert parallel_maximize(program, candidates, address_0, workers=2, chunk_size=7) == (
+        best, computer.run(*best)[0]
+    )
+    assert parallel_maximize(program, [], address_0, workers=2) is None
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+    program = get_program(input_file)
+
+    noun, verb = parallel_noun_verb_search(program, 19690720)
+    print("Solution:", 100 * noun + verb, "Noun:", noun, "Verb:", verb)
@@ -0,0 +1,286 @@
+import os
+
+from utils.intcode_computer import get_program, decode_opcode, POSITION_MODE, IMMEDIATE_MODE
+from utils.intcode_jit import CompiledIntCodeComputer
+
+
+class SymbolicExecutionError(Exception):
+    # The program's behaviour depends on noun/verb in a way that can't be followed symbolically
+    pass
+
+
+class Expression:
+    """
+    Polynomial in noun and verb with integer coefficients, stored as (noun power, verb power) -> coefficient.
+    Arithmetic with ints and other Expressions gives an Expression, or a plain int once nothing symbolic is left.
+    """
+
+    def __init__(self, terms):
+        self.terms = {powers: coefficient for powers, coefficient in terms.items() if coefficient}
+
+    @staticmethod
+    def simplify(terms):
+        expression = Expression(terms)
+        if not expression.terms:
+            return 0
+        if list(expression.terms) == [(0, 0)]:
+            return expression.terms[(0, 0)]
+        return expression
+
+    @staticmethod
+    def terms_of(value):
+        if isinstance(value, Expression):
+            return value.terms
+        return {(0, 0): value}
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for powers, coefficient in self.terms_of(other).items():
+            terms[powers] = terms.get(powers, 0) + coefficient
+        return self.simplify(terms)
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        terms = {}
+        for (noun_a, verb_a), coefficient_a in self.terms.items():
+            for (noun_b, verb_b), coefficient_b in self.terms_of(other).items():
+                powers = (noun_a + noun_b, verb_a + verb_b)
+                terms[powers] = terms.get(powers, 0) + coefficient_a * coefficient_b
+        return self.simplify(terms)
+
+    __rmul__ = __mul__
+
+    def coefficient(self, noun_power, verb_power):
+        return self.terms.get((noun_power, verb_power), 0)
+
+    @property
+    def is_affine(self):
+        return all(noun_power + verb_power <= 1 for noun_power, verb_power in self.terms)
+
+    def evaluate(self, noun, verb):
+        return sum(
+            coefficient * noun ** noun_power * verb ** verb_power
+            for (noun_power, verb_power), coefficient in self.terms.items()
+        )
+
+    def __repr__(self):
+        parts = []
+        for (noun_power, verb_power), coefficient in sorted(self.terms.items(), reverse=True):
+            factors = ["noun" if noun_power == 1 else "noun^{}".format(noun_power)] if noun_power else []
+            factors += ["verb" if verb_power == 1 else "verb^{}".format(verb_power)] if verb_power else []
+            if coefficient != 1 or not factors:
+                factors.insert(0, str(coefficient))
+            parts.append("*".join(factors))
+        return " + ".join(parts)
+
+
+NOUN = Expression({(1, 0): 1})
+VERB = Expression({(0, 1): 1})
+
+
+class Unknown:
+    # A value read through an address that depends on noun/verb. Fine as long as nothing ever uses it.
+    def __repr__(self):
+        return "UNKNOWN"
+
+
+UNKNOWN = Unknown()
+
+
+class SymbolicIntCodeComputer:
+    """
+    Runs a program with noun and verb (addresses 1 and 2) as symbols, e.g. to get memory[0] as an expression in them.
+
+    Control flow and every address written must stay concrete. Reading through an address that depends on noun/verb
+    gives UNKNOWN, which is only an error if it's later used for anything other than being overwritten (Day 2 programs
+    start by doing exactly that with a result that is then thrown away). Anything that can't be followed raises
+    SymbolicExecutionError. There is no input or output.
+    """
+    MAX_STEPS = 100000
+
+    def __init__(self, program):
+        self.program = program
+        self.memory = None
+        self.relative_base = 0
+
+    def run(self):
+        self.memory = dict(enumerate(self.program))
+        self.memory[1] = NOUN
+        self.memory[2] = VERB
+        self.relative_base = 0
+        instruction_pointer = 0
+        for _ in range(self.MAX_STEPS):
+            opcode = self.concrete(self.read(instruction_pointer), "opcode at {}".format(instruction_pointer))
+            try:
+                code, input_modes = decode_opcode(opcode)
+            except ValueError as e:
+                raise SymbolicExecutionError(str(e))
+            addresses = [
+                self.resolve(mode, instruction_pointer + offset)
+                for offset, (mode, _) in enumerate(input_modes, start=1)
+            ]
+            next_instruction_pointer = instruction_pointer + 1 + len(input_modes)
+
+            if code == 99:
+                return self.memory
+            elif code in (1, 2, 7, 8):
+                x, y = self.read(addresses[0]), self.read(addresses[1])
+                if x is UNKNOWN or y is UNKNOWN:
+                    result = UNKNOWN
+                elif code == 1:
+                    result = x + y
+                elif code == 2:
+                    result = x * y
+                else:
+                    x = self.concrete(x, "comparison")
+                    y = self.concrete(y, "comparison")
+                    result = int(x < y if code == 7 else x == y)
+                self.write(addresses[2], result)
+            elif code in (5, 6):
+                test = self.concrete(self.read(addresses[0]), "jump test")
+                if bool(test) == (code == 5):
+                    next_instruction_pointer = self.concrete(self.read(addresses[1]), "jump target")
+            elif code == 9:
+                self.relative_base += self.concrete(self.read(addresses[0]), "relative base")
+            else:
+                raise SymbolicExecutionError("I/O at {}".format(instruction_pointer))
+            instruction_pointer = next_instruction_pointer
+        raise SymbolicExecutionError("Gave up after {} steps".format(self.MAX_STEPS))
+
+    @staticmethod
+    def concrete(value, what):
+        if isinstance(value, int):
+            return value
+        raise SymbolicExecutionError("Symbolic {}: {}".format(what, value))
+
+    def resolve(self, mode, address):
+        # The address a parameter refers to, or UNKNOWN if that depends on noun/verb
+        if mode == IMMEDIATE_MODE:
+            return address
+        value = self.read(address)
+        if not isinstance(value, int):
+            return UNKNOWN
+        if mode == POSITION_MODE:
+            return value
+        return self.relative_base + value
+
+    def read(self, address):
+        if address is UNKNOWN:
+            return UNKNOWN
+        if address < 0:
+            raise SymbolicExecutionError("Negative address {}".format(address))
+        return self.memory.get(address, 0)
+
+    def write(self, address, value):
+        if address is UNKNOWN:
+            raise SymbolicExecutionError("Write to a symbolic address")
+        if address < 0:
+            raise SymbolicExecutionError("Negative address {}".format(address))
+        self.memory[address] = value
+
+
+def symbolic_output(program):
+    """
+    :return Union[int, Expression]: memory[0] after running program, in terms of noun and verb
+    """
+    output = SymbolicIntCodeComputer(program).run().get(0, 0)
+    if output is UNKNOWN:
+        raise SymbolicExecutionError("Output depends on a symbolic address")
+    return output
+
+
+def solve(expression, desired_output, limit=100):
+    """
+    The first (noun, verb) in the order a nested noun then verb loop would try them for which expression is
+    desired_output, or None. Affine expressions are solved for verb directly, anything else is evaluated.
+    """
+    if not isinstance(expression, Expression):
+        return (0, 0) if expression == desired_output else None
+    if expression.is_affine:
+        noun_coefficient = expression.coefficient(1, 0)
+        verb_coefficient = expression.coefficient(0, 1)
+        constant = expression.coefficient(0, 0)
+        for noun in range(limit):
+            remainder = desired_output - constant - noun_coefficient * noun
+            if verb_coefficient == 0:
+                if remainder == 0:
+                    return noun, 0
+            elif remainder % verb_coefficient == 0 and 0 <= remainder // verb_coefficient < limit:
+                return noun, remainder // verb_coefficient
+        return None
+    for noun in range(limit):
+        for verb in range(limit):
+            if expression.evaluate(noun, verb) == desired_output:
+                return noun, verb
+    return None
+
+
+def concrete_search(program, desired_output):
+    computer = CompiledIntCodeComputer(program)
+    for noun in range(100):
+        for verb in range(100):
+            memory = computer.run(noun, verb)
+            if memory is not None and memory[0] == desired_output:
+                return noun, verb
+    return None
+
+
+def solve_noun_verb(program, desired_output):
+    """
+    Day 2 part 2: the noun and verb that leave desired_output in address 0. Solved from one symbolic run where
+    possible, otherwise by trying every noun and verb.
+    """
+    try:
+        match = solve(symbolic_output(program), desired_output)
+    except SymbolicExecutionError:
+        match = concrete_search(program, desired_output)
+    if match is None:
+        raise ValueError("Desired value {} is unreachable!".format(desired_output))
+    return match
+
+
+def tests():
+    # Day 2 style: the first instruction reads through noun and verb, but its result is overwritten
+    program = [1, 0, 0, 3, 1, 1, 2, 3, 2, 1, 24, 25, 1, 25, 2, 0, 1, 0, 26, 0, 99, 0, 0, 0, 3, 0, 5]
+    output = symbolic_output(program)
+    assert output.is_affine and repr(output) == "3*noun + verb + 5"
+    computer = CompiledIntCodeComputer(program)
+    for noun, verb in ((0, 0), (3, 7), (12, 2), (99, 99)):
+        assert output.evaluate(noun, verb) == computer.run(noun, verb)[0]
+    desired_output = computer.run(13, 7)[0]
+    assert solve_noun_verb(program, desired_output) == concrete_search(program, desired_output)
+    try:
+        solve_noun_verb(program, -1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected the solve to fail")
+
+    # Not affine
+    output = symbolic_output([1, 0, 0, 3, 2, 1, 1, 3, 2, 3, 2, 0, 99])
+    assert repr(output) == "noun^2*verb"
+    assert solve(output, 12) == (1, 12)
+
+    # Branching on noun/verb can't be followed, so falls back to searching
+    program = [1101, 0, 0, 20, 1008, 20, 42, 21, 1005, 21, 14, 99, 0, 0, 1101, 7, 0, 0, 99, 0, 0, 0]
+    try:
+        symbolic_output(program)
+    except SymbolicExecutionError:
+        pass
+    else:
+        raise AssertionError("Expected symbolic execution to fail")
+    assert solve_noun_verb(program, 7) == (0, 42)
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+    program = get_program(input_file)
+
+    print("Output:", symbolic_output(program))
+    noun, verb = solve_noun_verb(program, 19690720)
+    print("Solution:", 100 * noun + verb, "Noun:", noun, "Verb:", verb)
@@ -0,0 +1,311 @@
+import os
+import time
+from itertools import product
+
+from utils.intcode_computer import (
+    IntCodeComputer, get_program, decode_opcode, POSITION_MODE, IMMEDIATE_MODE, WRITE_PARAM
+)
+from utils.intcode_memory import PagedMemory
+from utils.intcode_cache import RunResult, run_patched
+
+
+# Operation code -> the expression it computes, for the instructions that are replayed
+EXPRESSIONS = {
+    1: "{} + {}",
+    2: "{} * {}",
+    7: "1 if {} < {} else 0",
+    8: "1 if {} == {} else 0",
+}
+
+
+class Node:
+    # One line of the replay: target = expression, or just a guard (a condition that abandons the replay if true)
+    def __init__(self, target, expression, dependencies, guard=None, guard_dependencies=()):
+        self.target = target
+        self.expression = expression
+        self.dependencies = list(dependencies)
+        self.guard = guard
+        self.guard_dependencies = list(guard_dependencies)
+
+
+class IncrementalRunner:
+    """
+    Re-runs a program for different values of a few parameters (memory patches and/or inputs) without interpreting
+    the whole program each time.
+
+    The program is run once for reference values of the parameters, tracking which memory cells are tainted by them.
+    The instructions that compute tainted values are recorded as straight line code, and anything else is just part
+    of the recorded (untainted) result. Later runs execute only that code, compiled into one function, and patch its
+    results into the reference memory and outputs.
+
+    The recording is only valid while control flow doesn't change, so wherever a tainted value decides a jump, an
+    opcode, an address written or the relative base, the replay checks it has the reference value and falls back to
+    a full run if not. Reads through a tainted address are checked the same way, but only if the value read is used.
+    """
+
+    def __init__(self, program, patches=None, inputs=(), computer_class=IntCodeComputer):
+        """
+        :param List[int] -> program:
+        :param Dict[int, int] -> patches: The swept memory cells, with reference values
+        :param List[int] -> inputs: Reference inputs. Every input is swept.
+        """
+        self.program = program
+        self.patch_addresses = sorted(patches or {})
+        self.input_count = len(inputs)
+        self.computer = computer_class(program)
+        # Reference results
+        self.memory = None
+        self.outputs = None
+        self.halted = None
+        # Output index -> replay variable, for outputs that depend on the parameters
+        self.tainted_outputs = {}
+        # Address -> replay variable, for memory cells that depend on the parameters at the end of the run
+        self.tainted_cells = {}
+        self.nodes = []
+        self.variables = 0
+        self.instructions = 0
+        self.replay = None
+        self.replay_source = None
+        self.replays = 0
+        self.fallbacks = 0
+        self.record(patches or {}, list(inputs))
+        self.compile()
+
+    def new_variable(self):
+        self.variables += 1
+        return "v{}".format(self.variables)
+
+    def record(self, patches, inputs):
+        memory = PagedMemory(self.program)
+        # Address -> replay variable holding its value
+        taint = {}
+        for index, address in enumerate(self.patch_addresses):
+            memory[address] = patches[address]
+            taint[address] = "p{}".format(index)
+        input_variables = ["p{}".format(len(self.patch_addresses) + index) for index in range(len(inputs))]
+        remaining_inputs = list(zip(inputs, input_variables))
+        outputs = []
+        relative_base = 0
+        instruction_pointer = 0
+        self.halted = False
+
+        def operand(address):
+            # Replay expression for the value at address, and the variable it depends on if any
+            if address in taint:
+                return taint[address], [taint[address]]
+            return "({})".format(memory[address]), []
+
+        def guard_value(address):
+            # Check a tainted value has its reference value in the replay
+            if address in taint:
+                variable = taint[address]
+                self.nodes.append(Node(None, None, [], "{} != {}".format(variable, memory[address]), [variable]))
+
+        while True:
+            guard_value(instruction_pointer)
+            code, input_modes = decode_opcode(memory[instruction_pointer])
+            self.instructions += 1
+            addresses = []
+            reads = []
+            for offset, (mode, arg_type) in enumerate(input_modes, start=1):
+                word = instruction_pointer + offset
+                if mode == IMMEDIATE_MODE:
+                    address = word
+                elif mode == POSITION_MODE:
+                    address = memory[word]
+                else:
+                    address = relative_base + memory[word]
+                addresses.append(address)
+                pointer_taint = None if mode == IMMEDIATE_MODE else taint.get(word)
+                if pointer_taint is None:
+                    reads.append(operand(address))
+                elif arg_type == WRITE_PARAM:
+                    pointer = pointer_taint if mode == POSITION_MODE else "{} + {}".format(relative_base, pointer_taint)
+                    self.nodes.append(Node(None, None, [], "{} != {}".format(pointer, address), [pointer_taint]))
+                    reads.append(None)
+                else:
+                    # Read through a tainted pointer. Only needs checking if the value turns out to be used.
+                    pointer = pointer_taint if mode == POSITION_MODE else "{} + {}".format(relative_base, pointer_taint)
+                    value, dependencies = operand(address)
+                    variable = self.new_variable()
+                    self.nodes.append(Node(
+                        variable, value, dependencies, "{} != {}".format(pointer, address), [pointer_taint]
+                    ))
+                    reads.append((variable, [variable]))
+            next_instruction_pointer = instruction_pointer + 1 + len(input_modes)
+
+            if code in EXPRESSIONS:
+                (x, x_dependencies), (y, y_dependencies) = reads[0], reads[1]
+                x_value, y_value = memory[addresses[0]], memory[addresses[1]]
+                if code == 1:
+                    result = x_value + y_value
+                elif code == 2:
+                    result = x_value * y_value
+                elif code == 7:
+                    result = 1 if x_value < y_value else 0
+                else:
+                    result = 1 if x_value == y_value else 0
+                memory[addresses[2]] = result
+                if x_dependencies or y_dependencies:
+                    variable = self.new_variable()
+                    self.nodes.append(Node(
+                        variable, EXPRESSIONS[code].format(x, y), x_dependencies + y_dependencies
+                    ))
+                    taint[addresses[2]] = variable
+                else:
+                    taint.pop(addresses[2], None)
+            elif code == 3:
+                if not remaining_inputs:
+                    break
+                value, variable = remaining_inputs.pop(0)
+                memory[addresses[0]] = value
+                taint[addresses[0]] = variable
+            elif code == 4:
+                value, dependencies = reads[0]
+                if dependencies:
+                    self.tainted_outputs[len(outputs)] = value
+                outputs.append(memory[addresses[0]])
+            elif code in (5, 6):
+                test, dependencies = reads[0]
+                test_value = memory[addresses[0]]
+                if dependencies:
+                    condition = "not {}" if test_value else "{}"
+                    self.nodes.append(Node(None, None, [], condition.format(test), dependencies))
+                if bool(test_value) == (code == 5):
+                    jump, dependencies = reads[1]
+                    next_instruction_pointer = memory[addresses[1]]
+                    if dependencies:
+                        self.nodes.append(Node(
+                            None, None, [], "{} != {}".format(jump, next_instruction_pointer), dependencies
+                        ))
+            elif code == 9:
+                value, dependencies = reads[0]
+                if dependencies:
+                    self.nodes.append(Node(
+                        None, None, [], "{} != {}".format(value, memory[addresses[0]]), dependencies
+                    ))
+                relative_base += memory[addresses[0]]
+            else:
+                self.halted = True
+                break
+            instruction_pointer = next_instruction_pointer
+
+        self.memory = memory
+        self.outputs = tuple(outputs)
+        self.tainted_cells = taint
+
+    def compile(self):
+        # Drop everything the results and guards don't depend on, then generate the replay function
+        live = set(self.tainted_cells.values()) | set(self.tainted_outputs.values())
+        kept = []
+        for node in reversed(self.nodes):
+            if node.target is None or node.target in live:
+                kept.append(node)
+                live.update(node.dependencies)
+                live.update(node.guard_dependencies)
+        kept.reverse()
+
+        parameters = ["p{}".format(index) for index in range(len(self.patch_addresses) + self.input_count)]
+        lines = []
+        for node in kept:
+            if node.guard is not None:
+                lines.append("if {}:".format(node.guard))
+                lines.append("    return None")
+            if node.target is not None:
+                lines.append("{} = {}".format(node.target, node.expression))
+        cell_values = "".join("{}, ".format(variable) for variable in self.tainted_cells.values())
+        output_values = "".join("{}, ".format(variable) for variable in self.tainted_outputs.values())
+        lines.append("return ({}), ({})".format(cell_values, output_values))
+        self.replay_source = "def replay({}):\n".format(", ".join(parameters)) + "".join(
+            "    {}\n".format(line) for line in lines
+        )
+        namespace = {}
+        exec(compile(self.replay_source, "<intcode replay>", "exec"), namespace)
+        self.replay = namespace["replay"]
+        self.nodes = kept
+
+    @property
+    def replayed_instructions(self):
+        return sum(1 for node in self.nodes if node.target is not None)
+
+    def run(self, patches=None, inputs=()):
+        """
+        :param Dict[int, int] -> patches: Values for the swept memory cells. Must patch the same cells as the reference.
+        :param List[int] -> inputs: Must be as many as the reference inputs.
+        :return RunResult:
+        """
+        patches = patches or {}
+        if sorted(patches) != self.patch_addresses or len(inputs) != self.input_count:
+            raise ValueError("Parameters don't match the recorded run")
+        result = self.replay(*([patches[address] for address in self.patch_addresses] + list(inputs)))
+        if result is None:
+            self.fallbacks += 1
+            return run_patched(self.computer, patches, inputs)
+        self.replays += 1
+        cell_values, output_values = result
+        # Forks share the reference pages, so only the pages holding tainted cells are copied
+        memory = self.memory.fork()
+        for address, value in zip(self.tainted_cells, cell_values):
+            memory[address] = value
+        outputs = list(self.outputs)
+        for index, value in zip(self.tainted_outputs, output_values):
+            outputs[index] = value
+        return RunResult(tuple(outputs), memory, self.halted)
+
+
+def tests():
+    # Day 2 style noun/verb sweep. The first instruction reads through noun and verb, but its result is never used.
+    program = [1, 0, 0, 3, 1, 1, 2, 3, 2, 1, 24, 25, 1, 25, 2, 0, 1, 0, 26, 0, 99, 0, 0, 0, 3, 0, 5]
+    runner = IncrementalRunner(program, {1: 0, 2: 0})
+    computer = IntCodeComputer(program)
+    for noun, verb in product(range(30), range(30)):
+        assert runner.run({1: noun, 2: verb}) == run_patched(computer, {1: noun, 2: verb})
+    assert runner.fallbacks == 0
+    assert runner.replayed_instructions < runner.instructions
+
+    # Day 7 amplifier: phase and signal are inputs
+    amplifier = [3, 15, 3, 16, 1002, 16, 10, 16, 1, 16, 15, 15, 4, 15, 99, 0, 0]
+    runner = IncrementalRunner(amplifier, inputs=[0, 0])
+    for phase, signal in product(range(5), (0, 4, 43, 432)):
+        result = runner.run(inputs=[phase, signal])
+        assert result.outputs == (signal * 10 + phase,)
+        assert result == run_patched(IntCodeComputer(amplifier), inputs=[phase, signal])
+    assert runner.fallbacks == 0
+
+    # Branches on the input replay while they go the same way, and fall back to a full run when they don't
+    comparison_program = [
+        3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+        1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+        999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99
+    ]
+    runner = IncrementalRunner(comparison_program, inputs=[20])
+    assert runner.run(inputs=[9]).outputs == (1001,)
+    assert runner.run(inputs=[30]).memory[21] == 30
+    assert runner.replays == 2
+    assert runner.run(inputs=[8]).outputs == (1000,)
+    assert runner.run(inputs=[3]).outputs == (999,)
+    assert runner.fallbacks == 2
+
+    # Relative mode, and a loop whose length depends on the parameter
+    countdown = [1101, 0, 5, 100, 1001, 100, -1, 100, 1005, 100, 4, 204, 100, 99]
+    runner = IncrementalRunner(countdown, {2: 5})
+    assert runner.run({2: 5}).outputs == (0,) and runner.replays == 1
+    assert runner.run({2: 7}).outputs == (0,) and runner.fallbacks == 1
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+    program = get_program(input_file)
+
+    # Day 2 sweep
+    start = time.perf_counter()
+    runner = IncrementalRunner(program, {1: 0, 2: 0})
+    results = {(noun, verb): runner.run({1: noun, 2: verb}).memory[0] for noun, verb in product(range(100), range(100))}
+    print("Swept {} points in {:.3f}s, replaying {} of {} instructions ({} fallbacks)".format(
+        len(results), time.perf_counter() - start, runner.replayed_instructions, runner.instructions,
+        runner.fallbacks
+    ))
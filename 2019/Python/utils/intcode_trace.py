@@ -0,0 +1,200 @@
+import os
+import sys
+import struct
+from array import array
+
+from utils.intcode_computer import IntCodeComputer, get_program, OPCODES, WRITE_PARAM
+
+
+# Each record is RECORD_WIDTH signed 64 bit ints:
+# step, instruction pointer, opcode, 3 resolved parameter addresses (0 when unused), value written/output (else 0)
+RECORD_WIDTH = 7
+# Stored in place of values that don't fit in 64 bits
+OVERFLOW = -2 ** 63
+
+MAGIC = b"ICTR"
+# Magic, version, record width, record count. Everything in the file is little endian.
+HEADER = struct.Struct("<4sHHQ")
+VERSION = 1
+
+
+class TracingIntCodeComputer(IntCodeComputer):
+    """
+    IntCode computer that keeps a binary trace of the last trace_size instructions in a preallocated ring buffer,
+    instead of formatting a log line per instruction. The trace is only written out by dump(), or automatically to
+    trace_path if the program raises an error. Use read_trace/format_record (or run this module with the trace file
+    as an argument) to read it back.
+    """
+
+    def __init__(self, program, input_queue=None, output_queue=None, name="TracingIntCodeComputer", debug=False,
+                 log=None, trace_size=100000, trace_path=None):
+        # Needed by clear_caches, which the constructor calls
+        self.trace_size = trace_size
+        self.trace_path = trace_path
+        self.trace = None
+        self.trace_steps = None
+        super().__init__(program, input_queue, output_queue, name=name, debug=debug, log=log)
+
+    def clear_caches(self):
+        # A fork starts with a trace of its own rather than writing into its parent's
+        super().clear_caches()
+        self.trace = array("q", bytes(8 * RECORD_WIDTH * self.trace_size))
+        # Total instructions traced. The next record goes in slot trace_steps % trace_size.
+        self.trace_steps = 0
+
+    def execute(self, budget=None):
+        # Same loop as IntCodeComputer.execute, plus the tracing.
+        instruction_cache = self.instruction_cache
+        trace = self.trace
+        trace_size = self.trace_size
+        steps = 0
+        try:
+            while self.running:
+                instruction_pointer = self.instruction_pointer
+                opcode = self.program_memory[instruction_pointer]
+                instruction = instruction_cache.get(instruction_pointer)
+                if instruction is None or instruction[0] != opcode:
+                    instruction = self.decode(instruction_pointer)
+                _, method, input_modes, length = instruction
+                inputs = self.get_inputs(input_modes)
+                method(*inputs)
+
+                offset = (self.trace_steps % trace_size) * RECORD_WIDTH
+                trace[offset] = self.trace_steps
+                trace[offset + 1] = instruction_pointer
+                trace[offset + 2] = opcode
+                parameters = inputs + [0] * (3 - len(inputs))
+                if input_modes and input_modes[-1][1] == WRITE_PARAM:
+                    value = self.program_memory[inputs[-1]]
+                elif opcode % 100 == 4:
+                    value = self.program_memory[inputs[0]]
+                else:
+                    value = 0
+                for i, each in enumerate(parameters + [value], start=offset + 3):
+                    try:
+                        trace[i] = each
+                    except OverflowError:
+                        trace[i] = OVERFLOW
+                self.trace_steps += 1
+
+                if self.next_instruction_pointer is None:
+                    self.instruction_pointer += length
+                else:
+                    self.instruction_pointer = self.next_instruction_pointer
+                    self.next_instruction_pointer = None
+                steps += 1
+                if steps == budget:
+                    break
+        except Exception:
+            if self.trace_path:
+                self.dump(self.trace_path)
+            raise
+        return steps
+
+    def records(self):
+        # The traced records, oldest first
+        count = min(self.trace_steps, self.trace_size)
+        first = (self.trace_steps - count) % self.trace_size
+        for i in range(count):
+            offset = ((first + i) % self.trace_size) * RECORD_WIDTH
+            yield tuple(self.trace[offset:offset + RECORD_WIDTH])
+
+    def dump(self, path):
+        count = min(self.trace_steps, self.trace_size)
+        first = (self.trace_steps - count) % self.trace_size
+        # Unroll the ring so the file is in execution order
+        data = self.trace[first * RECORD_WIDTH:count * RECORD_WIDTH] + self.trace[:first * RECORD_WIDTH]
+        if sys.byteorder == "big":
+            data.byteswap()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD_WIDTH, count))
+            data.tofile(f)
+
+
+def read_trace(path):
+    with open(path, "rb") as f:
+        magic, version, width, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not an IntCode trace".format(path))
+        data = array("q")
+        data.fromfile(f, width * count)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return [tuple(data[i:i + width]) for i in range(0, len(data), width)]
+
+
+def format_record(record):
+    step, instruction_pointer, opcode, x, y, z, value = record
+    code = opcode % 100
+    name, args = OPCODES.get(code, ("unknown", ()))
+    parameters = ", ".join(str(address) for address in (x, y, z)[:len(args)])
+    line = "{:>10} {:>6}: {}({}) [{}]".format(step, instruction_pointer, name, opcode, parameters)
+    if code == 4:
+        line += " output {}".format("overflow" if value == OVERFLOW else value)
+    elif args and args[-1] == WRITE_PARAM:
+        line += " -> {}".format("overflow" if value == OVERFLOW else value)
+    return line
+
+
+def print_trace(path):
+    for record in read_trace(path):
+        print(format_record(record))
+
+
+def tests():
+    import tempfile
+
+    countdown = [1101, 0, 100, 100, 1001, 100, -1, 100, 1005, 100, 4, 4, 100, 99]
+    computer = TracingIntCodeComputer(countdown, [], [], trace_size=4)
+    computer.run()
+    records = list(computer.records())
+    # Only the last 4 of the 203 instructions are kept
+    assert [record[0] for record in records] == [199, 200, 201, 202]
+    assert records[-3] == (200, 8, 1005, 100, 10, 0, 0)
+    assert records[-2] == (201, 11, 4, 100, 0, 0, 0)
+    assert records[-4] == (199, 4, 1001, 100, 6, 100, 0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        trace_file = os.path.join(directory, "trace.bin")
+        computer.dump(trace_file)
+        assert read_trace(trace_file) == records
+        assert format_record(records[0]).split() == ["199", "4:", "add(1001)", "[100,", "6,", "100]", "->", "0"]
+
+        # Written automatically on an error, here a jump to an invalid opcode
+        computer = TracingIntCodeComputer([1102, 34915192, 34915192, 7, 1105, 1, 9, 0, 0, 98], [], [],
+                                          trace_path=trace_file)
+        computer.run()
+        records = read_trace(trace_file)
+        assert [record[2] for record in records] == [1102, 1105]
+        assert records[0][-1] == 1219070632396864
+
+    # A fork traces into a buffer of its own
+    computer = TracingIntCodeComputer(countdown, [], [], trace_size=4)
+    computer.boot()
+    computer.execute(budget=10)
+    parent_records = list(computer.records())
+    child = computer.fork()
+    child.resume()
+    assert child.trace is not computer.trace and child.trace_steps == 193
+    assert list(computer.records()) == parent_records and computer.trace_steps == 10
+    assert [record[0] for record in child.records()] == [189, 190, 191, 192]
+
+    # Values too big for the trace are marked rather than failing the program
+    computer = TracingIntCodeComputer([1102, 2 ** 62, 4, 5, 99, 0], [], [])
+    assert computer.run()[5] == 2 ** 64
+    assert list(computer.records())[0][-1] == OVERFLOW
+
+    print("Tests Done")
+
+
+if __name__ == "__main__":
+    tests()
+
+    if len(sys.argv) > 1:
+        print_trace(sys.argv[1])
+    else:
+        input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Input")
+        program = get_program(input_file)
+
+        computer = TracingIntCodeComputer(program, trace_path="trace.bin")
+        computer.run()